@@ -1,10 +1,27 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
+import functools
+import hashlib
 import os
 import json
 import logging
+import threading
 import traceback
-from chatbot_logic import process_message
-from pdf_generator import generate_resume_pdf_simple
+import uuid
+from dotenv import load_dotenv
+
+# Load .env before the project modules below read their settings at import
+load_dotenv()
+
+from chatbot_logic import process_message, stream_message, get_resume_state, provider, warm_up_llm
+from font_registry import font_registry
+from pdf_cache import PDFCache, pdf_key
+from render_pool import render_pool, RenderQueueFull
+from render_jobs import render_jobs
+from resume_schema import parse_resume, normalize_resume, validation_errors, ValidationError
+from idempotency import idempotency_cache
+from llm_cache import completion_cache
+from metrics import registry as metrics_registry
+from session_store import session_store
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
@@ -19,19 +36,131 @@ logging.basicConfig(
 # Directory for storing resumes
 RESUME_DIR = os.path.join(os.getcwd(), 'resumes')
 os.makedirs(RESUME_DIR, exist_ok=True)
+# Rendered resumes, named by the hash of their content
+pdf_cache = PDFCache(RESUME_DIR)
+
+# Chat sessions are identified by this cookie (or the X-Session-ID header)
+SESSION_COOKIE = 'session_id'
+SESSION_HEADER = 'X-Session-ID'
+# Duplicate chat requests (double submits, retries) carry the same key
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+def get_session_id():
+    """Return the caller's chat session id, or None if they have not got one yet"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if session_id and len(session_id) <= 128:
+        return session_id
+    return None
+
+def new_session_id(key=None):
+    """Session id for a caller who has none yet.
+
+    Derived from the client-supplied idempotency key when there is one, so
+    duplicates of a visitor's first request share the session and coalesce.
+    """
+    if key and isinstance(key, str) and len(key) <= 128:
+        return hashlib.sha256(f"session:{key}".encode("utf-8")).hexdigest()[:32]
+    return uuid.uuid4().hex
+
+def idempotency_key(endpoint, session_id, key):
+    """Scope a client-supplied idempotency key to the endpoint and session"""
+    if key and isinstance(key, str) and len(key) <= 128:
+        return (endpoint, session_id, key)
+    return None
+
+def reply_succeeded(result):
+    # Failed turns return no resume data; they are not replayed to retries
+    return result[1] is not None
+
+_services_started = False
+
+def start_background_services(warm_up=True):
+    """Warm up LLM connections, fonts and PDF render workers before the first request.
+
+    Called when the server starts (python app.py, or asgi.py's lifespan)
+    rather than at import: render workers may import the main module again
+    and must not start any of this. warm_up=False skips the sync LLM client.
+    """
+    global _services_started
+    if _services_started:
+        return
+    _services_started = True
+
+    # Open LLM connections in the background so the first user skips TCP/TLS setup
+    if warm_up and os.getenv("LLM_WARM_UP", "1") == "1":
+        threading.Thread(target=warm_up_llm, name="llm-warm-up", daemon=True).start()
+
+    # Parse the resume fonts now rather than in the first styled render
+    font_registry.preload()
+
+    # Start the PDF render workers, which warm their own fonts
+    threading.Thread(target=render_pool.start, name="render-pool-start", daemon=True).start()
+
+def sse_event(event, data):
+    """Format a Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Seconds between keep-alive comments on idle render job event streams
+JOB_EVENTS_KEEPALIVE = 15
+
+def read_resume():
+    """Validate the request's resume_data; returns (resume, None) or (None, error response)"""
+    resume_data = request.json.get('resume_data')
+
+    if not resume_data:
+        logging.error("No resume data provided in request")
+        return None, (jsonify({'error': 'No resume data provided'}), 400)
+
+    logging.debug(f"Resume data received: {json.dumps(resume_data, indent=2)}")
+
+    # Validate and normalize once, before anything reaches FPDF
+    try:
+        return parse_resume(resume_data), None
+    except ValidationError as e:
+        logging.error(f"Invalid resume data: {str(e)}")
+        return None, (jsonify({
+            'success': False,
+            'message': 'Invalid resume data',
+            'errors': validation_errors(e)
+        }), 400)
+
+def busy_response(e):
+    """503 with a Retry-After hint for a full render queue"""
+    logging.warning(str(e))
+    response = jsonify({
+        'success': False,
+        'message': 'The resume generator is busy. Please try again shortly.'
+    })
+    response.headers['Retry-After'] = str(max(1, round(e.retry_after)))
+    return response, 503
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    resp = app.make_response(render_template('index.html'))
+    # Give new visitors their session before the first message, so even
+    # duplicates of that message share one session
+    if get_session_id() is None:
+        resp.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+    return resp
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
         user_message = request.json.get('message', '')
-        logging.debug(f"Received user message: {user_message}")
+        client_key = request.headers.get(IDEMPOTENCY_HEADER) or request.json.get('idempotency_key')
+        session_id = get_session_id()
+        new_session = session_id is None
+        if new_session:
+            session_id = new_session_id(client_key)
+        logging.debug(f"Received user message for session {session_id}: {user_message}")
+        key = idempotency_key('chat', session_id, client_key)
         
-        # Process the message and get response
-        chatbot_response, resume_data = process_message(user_message)
+        # Process the message and get response (or the result of an identical request)
+        chatbot_response, resume_data = idempotency_cache.run(
+            key,
+            lambda: process_message(user_message, session_id, request.json.get('prompt_variant')),
+            cacheable=reply_succeeded,
+        )
         
         response = {
             'reply': chatbot_response,
@@ -39,7 +168,10 @@ def chat():
         }
         
         logging.debug(f"Sending response: {response}")
-        return jsonify(response)
+        resp = jsonify(response)
+        if new_session:
+            resp.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+        return resp
     except Exception as e:
         error_msg = f"Error in /api/chat: {str(e)}\n{traceback.format_exc()}"
         logging.error(error_msg)
@@ -48,27 +180,94 @@ def chat():
             'details': str(e)
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    try:
+        user_message = request.json.get('message', '')
+        client_key = request.headers.get(IDEMPOTENCY_HEADER) or request.json.get('idempotency_key')
+        session_id = get_session_id()
+        new_session = session_id is None
+        if new_session:
+            session_id = new_session_id(client_key)
+        prompt_variant = request.json.get('prompt_variant')
+        key = idempotency_key('stream', session_id, client_key)
+        logging.debug(f"Received streamed user message for session {session_id}: {user_message}")
+
+        def generate():
+            events = idempotency_cache.stream(key, lambda: stream_message(user_message, session_id, prompt_variant))
+            for event, data in events:
+                if event == 'token':
+                    yield sse_event('token', {'token': data})
+                else:
+                    logging.debug(f"Sending streamed response: {data}")
+                    yield sse_event(event, data)
+
+        resp = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        if new_session:
+            resp.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite='Lax')
+        return resp
+    except Exception as e:
+        error_msg = f"Error in /api/chat/stream: {str(e)}\n{traceback.format_exc()}"
+        logging.error(error_msg)
+        return jsonify({
+            'error': 'An internal server error occurred',
+            'details': str(e)
+        }), 500
+
+@app.route('/api/resume-state')
+def resume_state():
+    # Latest structured resume, including background extractions that
+    # finished after the last reply
+    return jsonify(get_resume_state(get_session_id()))
+
+@app.route('/api/stats')
+def stats():
+    return jsonify({
+        'sessions': session_store.stats(),
+        'completion_cache': completion_cache.stats(),
+        'idempotency': idempotency_cache.stats(),
+        'fonts': font_registry.stats(),
+        'pdf_cache': pdf_cache.stats(),
+        'render_pool': render_pool.stats(),
+        'render_jobs': render_jobs.stats(),
+        'llm': provider.stats()
+    })
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/generate-resume', methods=['POST'])
 def generate_resume():
     try:
-        resume_data = request.json.get('resume_data')
-        
-        if not resume_data:
-            logging.error("No resume data provided in request")
-            return jsonify({'error': 'No resume data provided'}), 400
+        resume, error = read_resume()
+        if error:
+            return error
         
-        logging.debug(f"Resume data received: {json.dumps(resume_data, indent=2)}")
-        
-        # Generate a unique filename
-        output_file = f"resume_{hash(str(resume_data))}.pdf"
-        file_path = os.path.join(RESUME_DIR, output_file)
-        
-        logging.debug(f"Generating PDF at path: {file_path}")
-        
-        # Generate PDF
-        pdf_path = generate_resume_pdf_simple(resume_data, output_file=file_path)
+        # Identical resumes share one PDF, rendered once
+        key = pdf_key(resume, "simple")
+        logging.debug(f"Resume PDF key: {key}")
+        # Rendered in a worker process so layout does not hold up chat requests
+        render = functools.partial(render_pool.render, "simple", normalize_resume(resume))
+
+        if request.args.get('inline') == '1':
+            # Send the PDF in this response instead of a download URL
+            pdf_bytes = pdf_cache.get_bytes(key, render)
+            if pdf_bytes is None:
+                logging.error("PDF generation failed - renderer returned None")
+                return jsonify({
+                    'success': False,
+                    'message': 'Failed to generate resume'
+                }), 500
+            return Response(pdf_bytes, mimetype='application/pdf', headers={
+                'Content-Disposition': f'attachment; filename="resume_{key[:16]}.pdf"',
+            })
+
+        pdf_path = pdf_cache.get_path(key, render)
         
-        if pdf_path and os.path.exists(pdf_path):
+        if pdf_path:
             logging.info(f"PDF generated successfully at: {pdf_path}")
             return jsonify({
                 'success': True,
@@ -76,11 +275,13 @@ def generate_resume():
                 'download_url': f'/download-resume/{os.path.basename(pdf_path)}'
             })
         else:
-            logging.error("PDF generation failed - returned None or file does not exist")
+            logging.error("PDF generation failed - renderer returned None")
             return jsonify({
                 'success': False,
                 'message': 'Failed to generate resume'
             }), 500
+    except RenderQueueFull as e:
+        return busy_response(e)
     except Exception as e:
         error_msg = f"Error generating resume: {str(e)}\n{traceback.format_exc()}"
         logging.error(error_msg)
@@ -89,6 +290,68 @@ def generate_resume():
             'message': f'Error generating resume: {str(e)}'
         }), 500
 
+@app.route('/jobs', methods=['POST'])
+def submit_render_job():
+    try:
+        resume, error = read_resume()
+        if error:
+            return error
+
+        key = pdf_key(resume, "simple")
+        resume_data = normalize_resume(resume)
+
+        def render_to_path(started):
+            render = functools.partial(render_pool.render, "simple", resume_data, on_start=started)
+            return pdf_cache.get_path(key, render)
+
+        # Rendered in the background; the client polls or listens for the result
+        job = render_jobs.submit(key, render_to_path)
+        logging.debug(f"Render job {job.job_id} for resume PDF key {key}")
+        response = job.to_dict()
+        response['status_url'] = f'/jobs/{job.job_id}'
+        response['events_url'] = f'/jobs/{job.job_id}/events'
+        return jsonify(response), 202
+    except RenderQueueFull as e:
+        return busy_response(e)
+    except Exception as e:
+        error_msg = f"Error submitting render job: {str(e)}\n{traceback.format_exc()}"
+        logging.error(error_msg)
+        return jsonify({
+            'success': False,
+            'message': f'Error generating resume: {str(e)}'
+        }), 500
+
+@app.route('/jobs/<job_id>')
+def render_job_status(job_id):
+    job = render_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Render job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def render_job_events(job_id):
+    job = render_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Render job not found'}), 404
+
+    def generate():
+        # One "state" event now and on every change, until the job finishes
+        version = job.version
+        yield sse_event('state', job.to_dict())
+        while not job.finished:
+            current = render_jobs.wait(job, version, JOB_EVENTS_KEEPALIVE)
+            if current == version:
+                # Keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            version = current
+            yield sse_event('state', job.to_dict())
+
+    resp = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
 @app.route('/download-resume/<filename>')
 def download_resume(filename):
     try:
@@ -110,4 +373,8 @@ def download_resume(filename):
         }), 500
 
 if __name__ == '__main__':
+    # With debug=True the reloader serves from a child process; the parent
+    # only watches files
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(debug=True) 
\ No newline at end of file
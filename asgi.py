@@ -0,0 +1,169 @@
+"""ASGI entry point that serves the chat endpoints on a single event loop.
+
+Run with an ASGI server, e.g. ``uvicorn asgi:app``. /api/chat and
+/api/chat/stream are handled natively with the AsyncGroq client; every other
+route is delegated to the Flask app, which remains usable on its own as the
+synchronous fallback (``python app.py``).
+"""
+import json
+import logging
+import os
+import traceback
+from http.cookies import SimpleCookie
+
+from asgiref.wsgi import WsgiToAsgi
+from dotenv import load_dotenv
+
+# Load .env before the project modules below read their settings at import
+load_dotenv()
+
+from app import (app as flask_app, SESSION_COOKIE, SESSION_HEADER, IDEMPOTENCY_HEADER,
+                 new_session_id, idempotency_key, reply_succeeded, sse_event,
+                 start_background_services)
+from chatbot_logic import process_message_async, stream_message_async, warm_up_llm_async
+from idempotency import idempotency_cache
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+def request_headers(scope):
+    return {name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope.get('headers', [])}
+
+
+def get_session_id(scope):
+    """Return the caller's chat session id, or None if they have not got one yet"""
+    headers = request_headers(scope)
+    session_id = headers.get(SESSION_HEADER.lower())
+    if not session_id and 'cookie' in headers:
+        cookie = SimpleCookie()
+        cookie.load(headers['cookie'])
+        if SESSION_COOKIE in cookie:
+            session_id = cookie[SESSION_COOKIE].value
+    if session_id and len(session_id) <= 128:
+        return session_id
+    return None
+
+
+async def read_json(receive):
+    """Read and decode a JSON request body"""
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return json.loads(body or b'{}')
+
+
+def response_headers(content_type, session_id=None):
+    headers = [(b'content-type', content_type.encode('latin-1'))]
+    if session_id:
+        cookie = f'{SESSION_COOKIE}={session_id}; Path=/; HttpOnly; SameSite=Lax'
+        headers.append((b'set-cookie', cookie.encode('latin-1')))
+    return headers
+
+
+async def send_json(send, data, status=200, session_id=None):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': response_headers('application/json', session_id),
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode('utf-8')})
+
+
+async def chat(scope, receive, send):
+    try:
+        body = await read_json(receive)
+        user_message = body.get('message', '')
+        client_key = request_headers(scope).get(IDEMPOTENCY_HEADER.lower()) or body.get('idempotency_key')
+        session_id = get_session_id(scope)
+        new_session = session_id is None
+        if new_session:
+            session_id = new_session_id(client_key)
+        logging.debug(f"Received async user message for session {session_id}: {user_message}")
+        key = idempotency_key('chat', session_id, client_key)
+
+        chatbot_response, resume_data = await idempotency_cache.run_async(
+            key,
+            lambda: process_message_async(user_message, session_id, body.get('prompt_variant')),
+            cacheable=reply_succeeded,
+        )
+
+        response = {
+            'reply': chatbot_response,
+            'resume_data': resume_data
+        }
+        logging.debug(f"Sending response: {response}")
+        await send_json(send, response, session_id=session_id if new_session else None)
+    except Exception as e:
+        logging.error(f"Error in async /api/chat: {str(e)}\n{traceback.format_exc()}")
+        await send_json(send, {
+            'error': 'An internal server error occurred',
+            'details': str(e)
+        }, status=500)
+
+
+async def chat_stream(scope, receive, send):
+    try:
+        body = await read_json(receive)
+        user_message = body.get('message', '')
+    except Exception as e:
+        logging.error(f"Error in async /api/chat/stream: {str(e)}\n{traceback.format_exc()}")
+        await send_json(send, {
+            'error': 'An internal server error occurred',
+            'details': str(e)
+        }, status=500)
+        return
+
+    client_key = request_headers(scope).get(IDEMPOTENCY_HEADER.lower()) or body.get('idempotency_key')
+    session_id = get_session_id(scope)
+    new_session = session_id is None
+    if new_session:
+        session_id = new_session_id(client_key)
+    key = idempotency_key('stream', session_id, client_key)
+    logging.debug(f"Received async streamed user message for session {session_id}: {user_message}")
+
+    headers = response_headers('text/event-stream; charset=utf-8', session_id if new_session else None)
+    headers += [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+    events = idempotency_cache.astream(
+        key, lambda: stream_message_async(user_message, session_id, body.get('prompt_variant')))
+    async for event, data in events:
+        if event == 'token':
+            chunk = sse_event('token', {'token': data})
+        else:
+            logging.debug(f"Sending streamed response: {data}")
+            chunk = sse_event(event, data)
+        await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Fonts and render workers; LLM warm-up uses the async client below
+            start_background_services(warm_up=False)
+            if os.getenv('LLM_WARM_UP', '1') == '1':
+                await warm_up_llm_async()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(scope, receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        if scope['path'] == '/api/chat':
+            await chat(scope, receive, send)
+            return
+        if scope['path'] == '/api/chat/stream':
+            await chat_stream(scope, receive, send)
+            return
+    await flask_asgi(scope, receive, send)
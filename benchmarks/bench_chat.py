@@ -0,0 +1,66 @@
+"""Load test for /api/chat against a running app.
+
+Start the stub LLM server and the app first, e.g.:
+
+    uvicorn stub_server:app --port 8001
+    LLM_PROVIDER=stub uvicorn asgi:app --port 8000
+
+Usage: python benchmarks/bench_chat.py [--url URL] [--requests N] [--concurrency C] [--stream]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+
+async def one_turn(client, url, message, stream):
+    # Each turn uses its own session so requests are not serialized on a session lock
+    headers = {"X-Session-ID": uuid.uuid4().hex}
+    started = time.perf_counter()
+    if stream:
+        async with client.stream("POST", url + "/api/chat/stream", json={"message": message},
+                                 headers=headers) as response:
+            async for _ in response.aiter_bytes():
+                pass
+    else:
+        response = await client.post(url + "/api/chat", json={"message": message}, headers=headers)
+    return response.status_code, time.perf_counter() - started
+
+
+async def run(url, total, concurrency, stream):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def bounded(i):
+            async with semaphore:
+                return await one_turn(client, url, f"Hello, this is benchmark user {i}", stream)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    failures = sum(1 for status, _ in results if status != 200)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"{total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s, {failures} failed")
+    print(f"latency p50 {percentile(0.5):.1f} ms  p95 {percentile(0.95):.1f} ms  p99 {percentile(0.99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream")
+    args = parser.parse_args()
+    asyncio.run(run(args.url.rstrip("/"), args.requests, args.concurrency, args.stream))
+
+
+if __name__ == "__main__":
+    main()
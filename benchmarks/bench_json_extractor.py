@@ -0,0 +1,100 @@
+"""Micro-benchmark for json_extractor on large, messy LLM replies.
+
+Usage: python benchmarks/bench_json_extractor.py [--size KB] [--repeat N]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from json_extractor import JSONExtractor, extract_json  # noqa: E402
+
+PROSE = [
+    "Great, thanks for sharing that! ",
+    "You can wrap code in `backticks` or ``double backticks`` if you like. ",
+    "Templates often look like {name} or {{title}}, which is not JSON. ",
+    "Here's a quote: “leadership matters”. ",
+    "Next, could you tell me about your education? ",
+]
+
+
+def resume_block(index):
+    data = {
+        "name": f"Candidate {index}",
+        "title": "Software Engineer",
+        "summary": "Builds {scalable} systems; likes \"quotes\" and back\\slashes.",
+        "skills": ["Python", "Go", "SQL"],
+        "experience": [{"position": "Developer", "company": "Tech Corp",
+                        "start_date": "2020-01", "end_date": "Present"}],
+    }
+    text = json.dumps(data, indent=2)
+    # Common LLM mistakes: trailing commas and Python literals
+    return text.replace('"SQL"', '"SQL",').replace('"Present"', '"Present", "current": True')
+
+
+def messy_reply(size_kb, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    index = 0
+    while length < size_kb * 1024:
+        if rng.random() < 0.15:
+            block = resume_block(index)
+            fenced = rng.random() < 0.7
+            part = f"\n```json\n{block}\n```\n" if fenced else f"\n{block}\n"
+            index += 1
+        else:
+            part = rng.choice(PROSE)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def legacy_extract(text):
+    # The extractor process_message used before json_extractor existed
+    try:
+        json_content = text.split("```")[1]
+        if json_content.startswith("json"):
+            json_content = json_content[4:].strip()
+        return json.loads(json_content)
+    except Exception:
+        return None
+
+
+def streamed_extract(text, token_size=4):
+    extractor = JSONExtractor()
+    for i in range(0, len(text), token_size):
+        extractor.feed(text[i:i + token_size])
+    return extractor.best()
+
+
+def bench(label, func, text, repeat):
+    result = func(text)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    elapsed = (time.perf_counter() - start) / repeat
+    mb_per_s = len(text) / elapsed / 1e6 if elapsed else float("inf")
+    status = "ok" if result else "FAILED"
+    print(f"{label:<28} {elapsed * 1000:9.3f} ms  {mb_per_s:8.2f} MB/s  extraction {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=64, help="reply size in KB")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    text = messy_reply(args.size)
+    print(f"Reply size: {len(text) / 1024:.1f} KB")
+    bench("legacy split('```')", legacy_extract, text, args.repeat)
+    bench("extract_json (whole text)", extract_json, text, args.repeat)
+    bench("JSONExtractor (4-char feed)", streamed_extract, text, max(1, args.repeat // 5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-render cost of ResumePDF with the process-wide font registry and without it.
+
+Usage: python benchmarks/bench_pdf_render.py [--repeat N]
+
+Run from the repository root so static/fonts is found.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import ResumePDF  # noqa: E402
+from font_registry import RESUME_FONTS, font_registry  # noqa: E402
+
+RESUME = {
+    "name": "Jane Doe",
+    "title": "Senior Software Engineer",
+    "summary": "Backend engineer focused on reliable, observable services. " * 3,
+    "skills": ["Python", "Go", "SQL", "Kubernetes", "PostgreSQL", "Redis"],
+    "experience": [
+        {"position": "Senior Engineer", "company": "Tech Corp", "start_date": "2020-01",
+         "end_date": "Present", "description": "Led the payments platform team. " * 4},
+        {"position": "Engineer", "company": "Startup Inc", "start_date": "2016-06",
+         "end_date": "2019-12", "description": "Built the first data pipeline. " * 4},
+    ],
+    "education": [{"degree": "BSc Computer Science", "institution": "State University",
+                   "start_date": "2012-09", "end_date": "2016-06"}],
+    "certifications": ["AWS Solutions Architect"],
+    "contact": {"email": "jane@example.com", "phone": "+1 555 0100"},
+}
+
+
+class UncachedResumePDF(ResumePDF):
+    """ResumePDF as it was before the registry: add_font parses every file per document"""
+
+    def __init__(self, margin=10):
+        super().__init__(margin)
+        self.pdf.fonts.clear()
+        for family, path in RESUME_FONTS.items():
+            self.pdf.add_font(family, "", path)
+
+
+def bench(label, cls, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        resume = cls()
+        resume.generate_from_json(RESUME)
+        resume.pdf.output()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<22} {elapsed * 1000:9.2f} ms/render")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if font_registry.preload() != len(RESUME_FONTS):
+        sys.exit("DejaVu fonts not found; run from the repository root")
+    warnings.simplefilter("ignore", DeprecationWarning)
+    uncached = bench("add_font per render", UncachedResumePDF, args.repeat)
+    cached = bench("font registry", ResumePDF, args.repeat)
+    print(f"Speed-up: {uncached / cached:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
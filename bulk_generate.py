@@ -0,0 +1,225 @@
+"""Render resume PDFs in bulk from a JSONL file, without the web app.
+
+Each line is a JSON object holding either ``resume_data`` or a transcript
+(``messages`` or ``conversation``: a list of {"role", "content"} messages).
+Transcripts go through the same extraction as the chat: every JSON block in
+the assistant replies is merged, in order, as a merge patch. An optional
+``id`` names the output file; otherwise the line number is used. Ids must be
+unique: a line repeating an earlier id is reported as failed, not rendered.
+
+Usage: python bulk_generate.py batch.jsonl [--out-dir DIR] [--workers N]
+       [--renderer simple|styled] [--batch-size N]
+
+Finished records are appended to DIR/progress.jsonl, so rerunning the same
+command after an interruption skips them.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from font_registry import font_registry
+from json_extractor import JSONExtractor
+from pdf_generator import ResumePDF, generate_resume_pdf_simple
+from resume_state import merge_patch
+
+PROGRESS_FILE = "progress.jsonl"
+# Seconds between throughput reports
+REPORT_INTERVAL = 5.0
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def record_key(record, line_no):
+    """Stable identifier of a record, used for its file name and progress"""
+    if isinstance(record, dict) and record.get("id") is not None:
+        return _UNSAFE_FILENAME.sub("_", str(record["id"]))[:100]
+    return f"line-{line_no}"
+
+
+def resume_from_transcript(messages):
+    """Fold the JSON blocks in a transcript's assistant replies into resume data"""
+    resume_data = {}
+    for message in messages:
+        if not isinstance(message, dict) or message.get("role") != "assistant":
+            continue
+        extractor = JSONExtractor()
+        extractor.feed(message.get("content") or "")
+        patch = extractor.best()
+        if isinstance(patch, dict):
+            resume_data = merge_patch(resume_data, patch)
+    return resume_data
+
+
+def resume_data_for(record):
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    if isinstance(record.get("resume_data"), dict):
+        return record["resume_data"]
+    messages = record.get("messages") or record.get("conversation")
+    if isinstance(messages, list):
+        resume_data = resume_from_transcript(messages)
+        if not resume_data:
+            raise ValueError("no resume data found in transcript")
+        return resume_data
+    raise ValueError("record has neither resume_data nor a transcript")
+
+
+def render(resume_data, path, renderer):
+    if renderer == "styled":
+        resume = ResumePDF()
+        resume.generate_from_json(resume_data)
+        return resume.save(path)
+    return generate_resume_pdf_simple(resume_data, output_file=path)
+
+
+def render_batch(batch, out_dir, renderer):
+    """Render (line_no, key, record, error) entries in a worker process; returns one result dict per entry"""
+    results = []
+    for line_no, key, record, error in batch:
+        try:
+            if error:
+                raise ValueError(error)
+            path = render(resume_data_for(record), os.path.join(out_dir, f"resume_{key}.pdf"), renderer)
+            if not path:
+                raise RuntimeError("PDF generation failed")
+            results.append({"key": key, "line": line_no, "status": "ok", "path": path})
+        except Exception as e:
+            results.append({"key": key, "line": line_no, "status": "error", "error": str(e)})
+    return results
+
+
+def load_progress(path):
+    """Return the keys of records already rendered successfully"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # A partial line from an interrupted run
+            if entry.get("status") == "ok":
+                done.add(entry["key"])
+    return done
+
+
+def read_batches(path, batch_size, done):
+    """Yield lists of (line_no, key, record, error), skipping blank lines and finished records
+
+    Each line is parsed once, here. A line that is not valid JSON, or whose
+    key repeats an earlier line's, carries an error instead of being rendered
+    (a repeated id would overwrite the first record's PDF).
+    """
+    batch = []
+    first_line = {}  # Key -> line it first appeared on
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record, error = None, None
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                error = f"invalid JSON: {e}"
+            key = record_key(record, line_no)
+            if key in first_line:
+                error = f"duplicate id {key!r} (first used on line {first_line[key]})"
+            else:
+                first_line[key] = line_no
+                if key in done:
+                    continue
+            batch.append((line_no, key, record, error))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class Progress:
+    """Counts results, appends them to the progress log and reports throughput"""
+
+    def __init__(self, path, skipped):
+        self.file = open(path, "a", encoding="utf-8")
+        self.skipped = skipped
+        self.ok = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def add(self, results):
+        for result in results:
+            if result["status"] == "ok":
+                self.ok += 1
+            else:
+                self.failed += 1
+                logging.error(f"Record {result['key']} (line {result['line']}) failed: {result['error']}")
+            self.file.write(json.dumps(result) + "\n")
+        self.file.flush()
+        now = time.perf_counter()
+        if now - self.last_report >= REPORT_INTERVAL:
+            self.last_report = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.started
+        rate = (self.ok + self.failed) / elapsed if elapsed else 0.0
+        label = "Finished" if final else "Progress"
+        print(f"{label}: {self.ok} rendered, {self.failed} failed, {self.skipped} already done "
+              f"in {elapsed:.1f}s ({rate:.1f} records/s)", file=sys.stderr)
+
+    def close(self):
+        self.file.close()
+
+
+def run(input_path, out_dir, workers, renderer, batch_size):
+    os.makedirs(out_dir, exist_ok=True)
+    progress_path = os.path.join(out_dir, PROGRESS_FILE)
+    done = load_progress(progress_path)
+    progress = Progress(progress_path, skipped=len(done))
+    # Only a few batches per worker are in flight, so memory stays bounded
+    # however large the input is
+    max_in_flight = workers * 2
+    pending = set()
+    try:
+        # Each worker parses the fonts once, not once per styled record
+        initializer = font_registry.preload if renderer == "styled" else None
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as executor:
+            for batch in read_batches(input_path, batch_size, done):
+                if len(pending) >= max_in_flight:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        progress.add(future.result())
+                pending.add(executor.submit(render_batch, batch, out_dir, renderer))
+            for future in wait(pending).done:
+                progress.add(future.result())
+    finally:
+        progress.report(final=True)
+        progress.close()
+    return progress.failed == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL file of resume_data records or transcripts")
+    parser.add_argument("--out-dir", default=os.path.join(os.getcwd(), "resumes", "bulk"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--renderer", choices=["simple", "styled"], default="simple",
+                        help="simple matches /generate-resume; styled uses ResumePDF")
+    parser.add_argument("--batch-size", type=int, default=16, help="records per worker task")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ok = run(args.input, args.out_dir, max(1, args.workers), args.renderer, max(1, args.batch_size))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
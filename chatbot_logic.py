@@ -1,10 +1,30 @@
+import asyncio
 import json
 import os
 import logging
+import re
+import time
 import traceback
-from groq import Groq
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+# Load environment variables first: the modules below read their settings
+# (SESSION_DB, rate limits, breaker thresholds, ...) when they are imported
+load_dotenv()
+
+from http_pool import last_call_timing
+from json_extractor import JSONExtractor
+from llm_client import RateLimitExceeded, last_call_retries
+from llm_cache import completion_cache, cache_key, is_cacheable
+from llm_providers import create_provider, last_stream_usage
+from metrics import record_llm_call, llm_requests, resume_extractions, resume_repairs
+from prompts import (prompt_registry, parse_variant, DEFAULT_PROMPT, EXTRACT_PROMPT,
+                     EXTRACT_PROMPT_VERSION, REPAIR_PROMPT, REPAIR_PROMPT_VERSION,
+                     FALLBACK_SYSTEM_PROMPT)
+from resume_schema import RESUME_PATCH_SCHEMA, parse_resume_patch
+from session_store import session_store
+
 # Set up logging
 logging.basicConfig(
     filename='app.log',
@@ -12,112 +32,588 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-# Load environment variables
-load_dotenv()
+# Chat completion backend, chosen by LLM_PROVIDER. A missing GROQ_API_KEY is
+# logged here and reported on the first call rather than at import time.
+provider = create_provider()
+
+# Maximum number of in-flight LLM calls on the async path
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "100"))
+_async_semaphore = None
+
+# Optionally extract the structured resume after every user turn, alongside
+# the conversational reply, so users never spend a turn asking for the JSON.
+# Off by default because it adds an extraction call to every turn.
+BACKGROUND_EXTRACTION = os.getenv("BACKGROUND_EXTRACTION", "0") == "1"
+BACKGROUND_EXTRACTION_WORKERS = int(os.getenv("BACKGROUND_EXTRACTION_WORKERS", "4"))
+_extraction_executor = None
+_extraction_tasks = set()  # Keeps running asyncio extraction tasks referenced
 
-# Initialize Groq client with API key
-groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
-    logging.error("GROQ_API_KEY not found in environment variables")
-    raise ValueError("GROQ_API_KEY not found")  # Better to stop execution
-else:
-    logging.debug("GROQ_API_KEY found in environment variables")
+def warm_up_llm():
+    """Open LLM connections before the first user request"""
+    return provider.warm_up()
+
+async def warm_up_llm_async():
+    """Open async LLM connections before the first user request"""
+    return await provider.warm_up_async()
+
+def _get_extraction_executor():
+    global _extraction_executor
+    if _extraction_executor is None:
+        _extraction_executor = ThreadPoolExecutor(max_workers=BACKGROUND_EXTRACTION_WORKERS,
+                                                  thread_name_prefix="resume-extraction")
+    return _extraction_executor
+
+def _get_async_semaphore():
+    global _async_semaphore
+    if _async_semaphore is None:
+        _async_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _async_semaphore
+
+# Chat model settings
+CHAT_MODEL = os.getenv("CHAT_MODEL", "llama3-8b-8192")
+CHAT_TEMPERATURE = float(os.getenv("CHAT_TEMPERATURE", "0.7"))
+# Model used for turns that have to emit the resume JSON
+EXTRACT_MODEL = os.getenv("EXTRACT_MODEL", "llama3-70b-8192")
+EXTRACT_TEMPERATURE = float(os.getenv("EXTRACT_TEMPERATURE", "0.1"))
+
+# Model routing: conversational turns go to the fast chat model, and only
+# structured-extraction turns go to the extraction model. Set LLM_ROUTING=0
+# to send every turn to the chat model.
+LLM_ROUTING = os.getenv("LLM_ROUTING", "1") == "1"
+# User messages matching this pattern ask for the structured resume. Plain
+# verbs like "build" or "generate" are left out: they also open ordinary first
+# turns ("help me build my resume").
+EXTRACT_ROUTE_PATTERN = re.compile(
+    os.getenv("EXTRACT_ROUTE_PATTERN", r"\b(json|pdf|finali[sz]e|download|export)\b"),
+    re.IGNORECASE,
+)
+# Use the extraction model for the turn after resume JSON failed to merge
+EXTRACT_ROUTE_ON_FAILURE = os.getenv("EXTRACT_ROUTE_ON_FAILURE", "1") == "1"
 
-client = Groq(api_key=groq_api_key)
+Route = namedtuple("Route", ["name", "model", "temperature"])
+CHAT_ROUTE = Route("chat", CHAT_MODEL, CHAT_TEMPERATURE)
+EXTRACT_ROUTE = Route("extract", EXTRACT_MODEL, EXTRACT_TEMPERATURE)
+BACKGROUND_ROUTE = Route("background", EXTRACT_MODEL, EXTRACT_TEMPERATURE)
+# Fixes extraction output that fails schema validation; the input is small,
+# so the fast model is enough
+REPAIR_ROUTE = Route("repair", CHAT_MODEL, 0.0)
 
-# Track conversation state
-conversation_history = []
-resume_data = {}
+# Structured output of the extraction call: "json_object" (JSON mode),
+# "json_schema" (JSON mode constrained to the resume patch schema, for models
+# that support it) or "off" (JSON is parsed out of free text)
+EXTRACT_RESPONSE_FORMAT = os.getenv("EXTRACT_RESPONSE_FORMAT", "json_object")
 
-def process_message(user_message):
-    global conversation_history
-    global resume_data
+# Prompt variants ("name" or "name:version") whose completions may be cached
+# even though CHAT_TEMPERATURE is not deterministic
+LLM_CACHE_PROMPTS = set(filter(None, os.getenv("LLM_CACHE_PROMPTS", "").split(",")))
 
+# Session used when the caller does not supply one
+DEFAULT_SESSION_ID = "default"
+
+# Token budget for the prompt sent upstream (system prompt + history). The
+# rest of llama3-8b-8192's context is left for the reply.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+# Latest messages always sent verbatim, even when over budget
+MIN_RECENT_MESSAGES = int(os.getenv("MIN_RECENT_MESSAGES", "2"))
+# Approximate per-message overhead of the chat format, in tokens
+MESSAGE_TOKEN_OVERHEAD = 4
+
+def load_system_prompt(variant=None, **variables):
+    """Render the system prompt variant ("name:version"), falling back to a built-in prompt"""
+    name, version = parse_variant(variant)
     try:
-        # Add user message to conversation history
-        conversation_history.append({"role": "user", "content": user_message})
-        logging.debug(f"Added user message to conversation history. Total messages: {len(conversation_history)}")
+        return prompt_registry.get(name, version, **variables)
+    except Exception as e:
+        logging.error(f"Error loading prompt template {variant}: {str(e)}")
+        return FALLBACK_SYSTEM_PROMPT
 
-        # Load the system prompt
-        try:
-            with open('prompt_template.txt', 'r') as file:
-                system_prompt = file.read()
-            logging.debug("Successfully loaded prompt template")
-        except Exception as e:
-            logging.error(f"Error loading prompt template: {str(e)}")
-            system_prompt = (
-                "You are an AI assistant that helps users create a professional resume. "
-                "Engage in a conversation to collect resume details (name, title, contact information, summary, skills, experience, education, certifications). "
-                "Store the information incrementally. "
-                "When sufficient data is collected or the user requests it, return the resume data as a JSON object inside a code block like this:\n"
-                "```json\n"
-                "{\n"
-                '    "name": "John Doe",\n'
-                '    "title": "Software Engineer",\n'
-                '    "contact": {\n'
-                '        "email": "john.doe@example.com",\n'
-                '        "phone": "+1-555-555-5555"\n'
-                "    },\n"
-                '    "summary": "Experienced software engineer with a background in developing scalable web applications and working across the full stack.",\n'
-                '    "skills": ["Python", "JavaScript", "AWS", "Docker"],\n'
-                '    "experience": [\n'
-                "        {\n"
-                '            "position": "Developer",\n'
-                '            "company": "Tech Corp",\n'
-                '            "start_date": "2020-01",\n'
-                '            "end_date": "Present",\n'
-                '            "description": "Led development of cloud-based solutions using AWS and Python."\n'
-                "        }\n"
-                "    ],\n"
-                '    "education": [\n'
-                "        {\n"
-                '            "degree": "B.S. in Computer Science",\n'
-                '            "institution": "State University",\n'
-                '            "start_date": "2014-09",\n'
-                '            "end_date": "2018-05"\n'
-                "        }\n"
-                "    ],\n"
-                '    "certifications": [\n'
-                '        "AWS Certified Developer – Associate"\n'
-                "    ]\n"
-                "}\n"
-                "```"
-            )
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            *conversation_history
-        ]
-
-        # Call the model
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=messages,
-            temperature=0.7,
+def estimate_tokens(text):
+    """Cheap local token estimate (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+def _message_tokens(message):
+    return estimate_tokens(message["content"]) + MESSAGE_TOKEN_OVERHEAD
+
+def _summary_message(session, omitted):
+    summary = f"{omitted} earlier messages of this conversation were omitted to save space."
+    if session.resume_data:
+        summary += (
+            " Resume details collected so far (treat these as already known):\n"
+            + json.dumps(session.resume_data, ensure_ascii=False)
         )
+    return {"role": "system", "content": summary}
 
-        assistant_response = response.choices[0].message.content
+def _count_recent(history, remaining):
+    # Number of latest messages that fit in the remaining budget, walking
+    # backwards so the cost is proportional to what is kept
+    kept = 0
+    for message in reversed(history):
+        cost = _message_tokens(message)
+        if kept >= MIN_RECENT_MESSAGES and cost > remaining:
+            break
+        remaining -= cost
+        kept += 1
+    return kept
 
-        conversation_history.append({"role": "assistant", "content": assistant_response})
+def compact_history(session, system_prompt, budget=None):
+    """Return the history to send upstream, keeping it within the token budget.
 
-        # Try to extract resume data if available
-        if "```json" in assistant_response or "```" in assistant_response:
-            try:
-                json_content = assistant_response.split("```")[1]
-                if json_content.startswith("json"):
-                    json_content = json_content[4:].strip()
-                resume_data = json.loads(json_content)
-            except Exception as e:
-                logging.error(f"Error extracting JSON: {str(e)}")
+    The latest turns are kept verbatim; older turns are folded into a single
+    note carrying the structured resume state collected so far.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    history = session.conversation_history
+    remaining = budget - estimate_tokens(system_prompt) - MESSAGE_TOKEN_OVERHEAD
 
-        return assistant_response, resume_data
+    kept = _count_recent(history, remaining)
+    if kept == len(history):
+        return list(history)
+
+    kept = _count_recent(history, remaining - _message_tokens(_summary_message(session, len(history))))
+    omitted = len(history) - kept
+    logging.debug(f"Compacted session {session.session_id}: omitted {omitted} of {len(history)} messages")
+    return [_summary_message(session, omitted), *history[omitted:]]
+
+def _build_messages(session):
+    system_prompt = load_system_prompt(session.prompt_variant)
+    return [
+        {"role": "system", "content": system_prompt},
+        *compact_history(session, system_prompt)
+    ]
+
+def choose_route(session, user_message):
+    """Return the Route (model and temperature) for this turn"""
+    if not LLM_ROUTING:
+        return CHAT_ROUTE
+    if EXTRACT_ROUTE_ON_FAILURE and session.extraction_failed:
+        return EXTRACT_ROUTE
+    if EXTRACT_ROUTE_PATTERN.search(user_message):
+        return EXTRACT_ROUTE
+    return CHAT_ROUTE
+
+def _extract_resume_data(session, assistant_response, route, extractor=None):
+    # Merge the best resume-like JSON object in the reply, if there is one.
+    # Streaming callers pass the extractor they fed token by token.
+    if extractor is None:
+        extractor = JSONExtractor()
+        extractor.feed(assistant_response)
+    session.extraction_failed = False
+    patch = extractor.best()
+    if patch is None:
+        if extractor.candidates:
+            logging.error(f"Could not extract resume JSON from {len(extractor.candidates)} candidate objects")
+            session.extraction_failed = True
+            resume_extractions.inc(route=route.name, result="failed")
+        else:
+            resume_extractions.inc(route=route.name, result="none")
+        return
+    try:
+        paths = session.apply_resume_patch(patch)
+        logging.debug(f"Merged resume fields {paths} into session {session.session_id} (version {session.resume_version})")
+        resume_extractions.inc(route=route.name, result="merged")
+    except Exception as e:
+        logging.error(f"Error merging resume JSON: {str(e)}")
+        session.extraction_failed = True
+        resume_extractions.inc(route=route.name, result="failed")
+
+def _build_extraction_messages(session):
+    system_prompt = prompt_registry.get(
+        EXTRACT_PROMPT, EXTRACT_PROMPT_VERSION,
+        resume_json=json.dumps(session.resume_data, ensure_ascii=False, indent=2),
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        *compact_history(session, system_prompt)
+    ]
+
+def _start_extraction(session):
+    # Called with the session lock held, right after the user message is
+    # added. Returns (seq, messages) for the extraction call.
+    session.extraction_seq += 1
+    return session.extraction_seq, _build_extraction_messages(session)
+
+def _response_format_params():
+    if EXTRACT_RESPONSE_FORMAT == "json_schema":
+        return {"response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "resume_patch", "schema": RESUME_PATCH_SCHEMA},
+        }}
+    if EXTRACT_RESPONSE_FORMAT == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+def _repair_messages(reply, errors):
+    system_prompt = prompt_registry.get(REPAIR_PROMPT, REPAIR_PROMPT_VERSION,
+                                        schema_json=json.dumps(RESUME_PATCH_SCHEMA, indent=2))
+    problems = "\n".join(f"- {error}" for error in errors)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Fix this JSON:\n{reply}\n\nProblems:\n{problems}"},
+    ]
+
+def _repair_result(session, errors, repaired_errors):
+    logging.debug(f"Extraction output for session {session.session_id} failed validation: {errors}")
+    resume_repairs.inc(result="failed" if repaired_errors else "ok")
+    if repaired_errors:
+        logging.error(f"Repaired extraction output is still invalid: {repaired_errors}")
+
+def _extract_patch(session, messages):
+    # Run the extraction call in JSON mode and validate its output, with one
+    # cheap repair call when validation fails. Returns the patch or None.
+    started = time.perf_counter()
+    result = provider.chat(messages, BACKGROUND_ROUTE.model, BACKGROUND_ROUTE.temperature,
+                           **_response_format_params())
+    _record_call(session, "chat", BACKGROUND_ROUTE, started, result.usage)
+    patch, errors = parse_resume_patch(result.text, session.resume_data)
+    if not errors:
+        return patch
+
+    started = time.perf_counter()
+    repaired = provider.chat(_repair_messages(result.text, errors), REPAIR_ROUTE.model,
+                             REPAIR_ROUTE.temperature, **_response_format_params())
+    _record_call(session, "chat", REPAIR_ROUTE, started, repaired.usage)
+    patch, repaired_errors = parse_resume_patch(repaired.text, session.resume_data)
+    _repair_result(session, errors, repaired_errors)
+    return patch
+
+async def _extract_patch_async(session, messages):
+    # Async version of _extract_patch
+    async with _get_async_semaphore():
+        started = time.perf_counter()
+        result = await provider.achat(messages, BACKGROUND_ROUTE.model, BACKGROUND_ROUTE.temperature,
+                                      **_response_format_params())
+    _record_call(session, "chat", BACKGROUND_ROUTE, started, result.usage)
+    patch, errors = parse_resume_patch(result.text, session.resume_data)
+    if not errors:
+        return patch
+
+    async with _get_async_semaphore():
+        started = time.perf_counter()
+        repaired = await provider.achat(_repair_messages(result.text, errors), REPAIR_ROUTE.model,
+                                        REPAIR_ROUTE.temperature, **_response_format_params())
+    _record_call(session, "chat", REPAIR_ROUTE, started, repaired.usage)
+    patch, repaired_errors = parse_resume_patch(repaired.text, session.resume_data)
+    _repair_result(session, errors, repaired_errors)
+    return patch
+
+def _apply_extraction(session, seq, patch, failed):
+    # Called with the session lock held. Results older than one already
+    # merged (or from before a reset) are dropped.
+    if seq <= session.extraction_applied:
+        logging.debug(f"Dropped stale background extraction {seq} for session {session.session_id}")
+        return
+    session.extraction_applied = seq
+    if failed:
+        resume_extractions.inc(route=BACKGROUND_ROUTE.name, result="failed")
+        return
+    try:
+        paths = session.apply_resume_patch(patch)
+        if not paths:
+            resume_extractions.inc(route=BACKGROUND_ROUTE.name, result="none")
+            return
+        logging.debug(f"Background extraction merged {paths} into session {session.session_id} (version {session.resume_version})")
+        resume_extractions.inc(route=BACKGROUND_ROUTE.name, result="merged")
+    except Exception as e:
+        logging.error(f"Error merging background resume JSON: {str(e)}")
+        resume_extractions.inc(route=BACKGROUND_ROUTE.name, result="failed")
+
+def _run_extraction(session, seq, messages):
+    try:
+        patch = None
+        try:
+            patch = _extract_patch(session, messages)
+        except Exception:
+            logging.error(f"Error in background extraction: {traceback.format_exc()}")
+            llm_requests.inc(mode="chat", route=BACKGROUND_ROUTE.name, outcome="error")
+        # Waits for the reply in progress to finish before merging
+        with session.lock:
+            _apply_extraction(session, seq, patch, failed=patch is None)
+    finally:
+        session_store.unpin(session)
+
+async def _run_extraction_async(session, seq, messages):
+    try:
+        patch = None
+        try:
+            patch = await _extract_patch_async(session, messages)
+        except Exception:
+            logging.error(f"Error in background extraction: {traceback.format_exc()}")
+            llm_requests.inc(mode="chat", route=BACKGROUND_ROUTE.name, outcome="error")
+        await session.acquire_async()
+        try:
+            _apply_extraction(session, seq, patch, failed=patch is None)
+        finally:
+            session.lock.release()
+    finally:
+        session_store.unpin(session)
+
+def _schedule_extraction(session):
+    """Extract the resume from the conversation on the thread pool, without waiting"""
+    if not BACKGROUND_EXTRACTION:
+        return
+    try:
+        seq, messages = _start_extraction(session)
+    except Exception as e:
+        logging.error(f"Could not start background extraction: {str(e)}")
+        return
+    # Unpinned once the result is merged
+    session_store.pin(session)
+    _get_extraction_executor().submit(_run_extraction, session, seq, messages)
+
+def _schedule_extraction_async(session):
+    """Extract the resume from the conversation in an asyncio task, without waiting"""
+    if not BACKGROUND_EXTRACTION:
+        return
+    try:
+        seq, messages = _start_extraction(session)
+    except Exception as e:
+        logging.error(f"Could not start background extraction: {str(e)}")
+        return
+    # Unpinned once the result is merged
+    session_store.pin(session)
+    task = asyncio.get_running_loop().create_task(_run_extraction_async(session, seq, messages))
+    _extraction_tasks.add(task)
+    task.add_done_callback(_extraction_tasks.discard)
+
+def _record_call(session, mode, route, started, usage):
+    timing = last_call_timing.get()
+    retries = last_call_retries.get()
+    latency = time.perf_counter() - started
+    logging.debug(f"LLM {mode} call on route {route.name} ({route.model}) for session {session.session_id}: "
+                  f"{latency:.3f}s, {retries} retries, timing {timing}, usage {usage}")
+    record_llm_call(mode, route.name, latency, usage=usage, timing=timing, retries=retries)
+
+def _cache_key(session, messages, route):
+    # Key for the completion cache, or None when this call must not be cached
+    variant = session.prompt_variant or DEFAULT_PROMPT
+    opt_in = variant in LLM_CACHE_PROMPTS or parse_variant(variant)[0] in LLM_CACHE_PROMPTS
+    if not is_cacheable(route.temperature, opt_in=opt_in):
+        return None
+    return cache_key(route.model, route.temperature, messages)
+
+def _complete(session, messages, route):
+    key = _cache_key(session, messages, route)
+    if key:
+        cached = completion_cache.get(key)
+        if cached is not None:
+            logging.debug(f"Completion cache hit for session {session.session_id}")
+            llm_requests.inc(mode="chat", route=route.name, outcome="cache_hit")
+            return cached
+
+    started = time.perf_counter()
+    result = provider.chat(messages, route.model, route.temperature)
+    _record_call(session, "chat", route, started, result.usage)
+    assistant_response = result.text
+
+    if key:
+        completion_cache.put(key, assistant_response)
+    return assistant_response
+
+async def _complete_async(session, messages, route):
+    key = _cache_key(session, messages, route)
+    if key:
+        cached = await completion_cache.get_async(key)
+        if cached is not None:
+            logging.debug(f"Completion cache hit for session {session.session_id}")
+            llm_requests.inc(mode="chat", route=route.name, outcome="cache_hit")
+            return cached
+
+    async with _get_async_semaphore():
+        started = time.perf_counter()
+        result = await provider.achat(messages, route.model, route.temperature)
+    _record_call(session, "chat", route, started, result.usage)
+    assistant_response = result.text
+
+    if key:
+        await completion_cache.put_async(key, assistant_response)
+    return assistant_response
+
+def _error_reply(error):
+    if isinstance(error, RateLimitExceeded):
+        return f"I'm handling a lot of requests right now. Please try again in about {max(1, round(error.retry_after))} seconds."
+    return "Sorry, something went wrong."
+
+def _finish_turn(session, assistant_response, route, extractor=None):
+    session.add_message("assistant", assistant_response)
+    _extract_resume_data(session, assistant_response, route, extractor)
+    return assistant_response, session.resume_data
+
+def _start_turn(session, user_message):
+    # Returns the history length to roll back to if the turn fails, so a
+    # retry does not send the same user message twice
+    history_length = len(session.conversation_history)
+    session.add_message("user", user_message)
+    logging.debug(f"Added user message to session {session.session_id}. Total messages: {len(session.conversation_history)}")
+    return history_length
+
+def process_message(user_message, session_id=DEFAULT_SESSION_ID, prompt_variant=None):
+    session = session_store.get(session_id, pin=True)
+    try:
+        if prompt_variant:
+            session.set_prompt_variant(prompt_variant)
+        with session.lock:
+            return _process_session_message(session, user_message)
+    finally:
+        session_store.unpin(session)
+
+def _process_session_message(session, user_message):
+    route = choose_route(session, user_message)
+    history_length = _start_turn(session, user_message)
+    _schedule_extraction(session)
+    try:
+        assistant_response = _complete(session, _build_messages(session), route)
+        return _finish_turn(session, assistant_response, route)
 
     except Exception as e:
         logging.error(f"Error in process_message: {traceback.format_exc()}")
-        return "Sorry, something went wrong.", None
+        llm_requests.inc(mode="chat", route=route.name, outcome="error")
+        session.truncate_history(history_length)
+        return _error_reply(e), None
+
+def stream_message(user_message, session_id=DEFAULT_SESSION_ID, prompt_variant=None):
+    """Stream a reply as ("token", text) events followed by one ("done", result) event"""
+    session = session_store.get(session_id, pin=True)
+    try:
+        if prompt_variant:
+            session.set_prompt_variant(prompt_variant)
+        with session.lock:
+            yield from _stream_session_message(session, user_message)
+    finally:
+        session_store.unpin(session)
+
+def _stream_session_message(session, user_message):
+    route = choose_route(session, user_message)
+    history_length = _start_turn(session, user_message)
+    _schedule_extraction(session)
+    try:
+        messages = _build_messages(session)
+        key = _cache_key(session, messages, route)
+        cached = completion_cache.get(key) if key else None
+        if cached is not None:
+            logging.debug(f"Completion cache hit for session {session.session_id}")
+            llm_requests.inc(mode="stream", route=route.name, outcome="cache_hit")
+            yield "token", cached
+            reply, resume_data = _finish_turn(session, cached, route)
+            yield "done", {"reply": reply, "resume_data": resume_data}
+            return
+
+        parts = []
+        extractor = JSONExtractor()
+        started = time.perf_counter()
+        for token in provider.stream(messages, route.model, route.temperature):
+            parts.append(token)
+            extractor.feed(token)
+            yield "token", token
+
+        _record_call(session, "stream", route, started, last_stream_usage.get())
+        assistant_response = "".join(parts)
+        if key:
+            completion_cache.put(key, assistant_response)
+        reply, resume_data = _finish_turn(session, assistant_response, route, extractor)
+        yield "done", {"reply": reply, "resume_data": resume_data}
+
+    except Exception as e:
+        logging.error(f"Error in stream_message: {traceback.format_exc()}")
+        llm_requests.inc(mode="stream", route=route.name, outcome="error")
+        session.truncate_history(history_length)
+        yield "error", {"reply": _error_reply(e), "resume_data": None}
+
+async def process_message_async(user_message, session_id=DEFAULT_SESSION_ID, prompt_variant=None):
+    """Async version of process_message built on the provider's async client"""
+    session = await session_store.get_async(session_id, pin=True)
+    try:
+        if prompt_variant:
+            session.set_prompt_variant(prompt_variant)
+        await session.acquire_async()
+        try:
+            return await _process_session_message_async(session, user_message)
+        finally:
+            session.lock.release()
+    finally:
+        session_store.unpin(session)
+
+async def _process_session_message_async(session, user_message):
+    route = choose_route(session, user_message)
+    history_length = _start_turn(session, user_message)
+    _schedule_extraction_async(session)
+    try:
+        assistant_response = await _complete_async(session, _build_messages(session), route)
+        return _finish_turn(session, assistant_response, route)
+
+    except Exception as e:
+        logging.error(f"Error in process_message_async: {traceback.format_exc()}")
+        llm_requests.inc(mode="chat", route=route.name, outcome="error")
+        session.truncate_history(history_length)
+        return _error_reply(e), None
+
+async def stream_message_async(user_message, session_id=DEFAULT_SESSION_ID, prompt_variant=None):
+    """Async version of stream_message built on the provider's async client"""
+    session = await session_store.get_async(session_id, pin=True)
+    try:
+        if prompt_variant:
+            session.set_prompt_variant(prompt_variant)
+        await session.acquire_async()
+        try:
+            async for event in _stream_session_message_async(session, user_message):
+                yield event
+        finally:
+            session.lock.release()
+    finally:
+        session_store.unpin(session)
+
+async def _stream_session_message_async(session, user_message):
+    route = choose_route(session, user_message)
+    history_length = _start_turn(session, user_message)
+    _schedule_extraction_async(session)
+    try:
+        messages = _build_messages(session)
+        key = _cache_key(session, messages, route)
+        cached = await completion_cache.get_async(key) if key else None
+        if cached is not None:
+            logging.debug(f"Completion cache hit for session {session.session_id}")
+            llm_requests.inc(mode="stream", route=route.name, outcome="cache_hit")
+            yield "token", cached
+            reply, resume_data = _finish_turn(session, cached, route)
+            yield "done", {"reply": reply, "resume_data": resume_data}
+            return
+
+        parts = []
+        extractor = JSONExtractor()
+        async with _get_async_semaphore():
+            started = time.perf_counter()
+            async for token in provider.astream(messages, route.model, route.temperature):
+                parts.append(token)
+                extractor.feed(token)
+                yield "token", token
+
+        _record_call(session, "stream", route, started, last_stream_usage.get())
+        assistant_response = "".join(parts)
+        if key:
+            await completion_cache.put_async(key, assistant_response)
+        reply, resume_data = _finish_turn(session, assistant_response, route, extractor)
+        yield "done", {"reply": reply, "resume_data": resume_data}
+
+    except Exception as e:
+        logging.error(f"Error in stream_message_async: {traceback.format_exc()}")
+        llm_requests.inc(mode="stream", route=route.name, outcome="error")
+        session.truncate_history(history_length)
+        yield "error", {"reply": _error_reply(e), "resume_data": None}
+
+def get_resume_state(session_id=DEFAULT_SESSION_ID):
+    """Return the latest resume data for a session, including background extractions"""
+    session = session_store.peek(session_id)
+    if session is None:
+        return {"resume_data": {}, "resume_version": 0, "extraction_pending": False}
+    # Read without the session lock so polling never waits for a reply in
+    # progress; merges replace resume_data rather than mutating it
+    return {
+        "resume_data": session.resume_data,
+        "resume_version": session.resume_version,
+        "extraction_pending": session.extraction_pending,
+    }
 
-def reset_conversation():
-    global conversation_history
-    global resume_data
-    conversation_history = []
-    resume_data = {}
+def reset_conversation(session_id=DEFAULT_SESSION_ID):
+    session = session_store.peek(session_id)
+    if session is not None:
+        with session.lock:
+            session.reset()
@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from llm_client import RateLimitExceeded
+from metrics import llm_circuit_state, llm_circuit_transitions, llm_circuit_rejected
+
+# Circuit breaker settings (overridable from the environment). They are read
+# when a provider or breaker is built, not at import, so values from .env
+# apply whatever the import order.
+# Open after LLM_BREAKER_FAILURES upstream failures within LLM_BREAKER_WINDOW
+# seconds
+DEFAULT_FAILURES = "5"
+DEFAULT_WINDOW = "30"
+# Seconds to stay open (LLM_BREAKER_COOLDOWN) before letting
+# LLM_BREAKER_HALF_OPEN_PROBES probe calls through
+DEFAULT_COOLDOWN = "30"
+DEFAULT_HALF_OPEN_PROBES = "1"
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def breaker_enabled():
+    """Whether providers get a circuit breaker (LLM_BREAKER_ENABLED, on by default)"""
+    return os.getenv("LLM_BREAKER_ENABLED", "1") == "1"
+
+
+class CircuitOpenError(RateLimitExceeded):
+    """The provider's circuit is open; retry_after is the rest of the cooldown"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(retry_after, f"LLM provider {name} is unavailable, retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    """Opens after repeated upstream failures so calls fail fast instead of waiting.
+
+    Closed: calls go through and failures within the window are counted.
+    Open: calls are rejected until the cooldown has passed.
+    Half-open: a limited number of probe calls go through; a success closes
+    the circuit and a failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=None, window=None, cooldown=None, half_open_probes=None):
+        self.name = name
+        self.failure_threshold = (failure_threshold if failure_threshold is not None
+                                  else int(os.getenv("LLM_BREAKER_FAILURES", DEFAULT_FAILURES)))
+        self.window = window if window is not None else float(os.getenv("LLM_BREAKER_WINDOW", DEFAULT_WINDOW))
+        self.cooldown = cooldown if cooldown is not None else float(os.getenv("LLM_BREAKER_COOLDOWN", DEFAULT_COOLDOWN))
+        self.half_open_probes = (half_open_probes if half_open_probes is not None
+                                 else int(os.getenv("LLM_BREAKER_HALF_OPEN_PROBES", DEFAULT_HALF_OPEN_PROBES)))
+        self.state = CLOSED
+        self.rejected = 0
+        self._failures = deque()  # monotonic times of recent failures
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        llm_circuit_state.set(_STATE_VALUES[CLOSED], provider=name)
+
+    def allow(self):
+        """Whether a call may be sent now; rejected calls are counted"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.rejected += 1
+        llm_circuit_rejected.inc(provider=self.name)
+        return False
+
+    def retry_after(self):
+        """Seconds until the circuit lets probe calls through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self.cooldown - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self._transition(OPEN, now)
+            elif self.state == CLOSED:
+                self._failures.append(now)
+                while self._failures and now - self._failures[0] > self.window:
+                    self._failures.popleft()
+                if len(self._failures) >= self.failure_threshold:
+                    self._transition(OPEN, now)
+
+    def release(self):
+        """End a call whose outcome says nothing about the provider's health"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def error(self):
+        return CircuitOpenError(self.name, self.retry_after())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_failures": len(self._failures),
+                "rejected": self.rejected,
+            }
+
+    def _transition(self, state, now=None):
+        # Called with the lock held
+        logging.warning(f"LLM circuit for {self.name} is now {state}")
+        self.state = state
+        self._probes = 0
+        self._failures.clear()
+        if state == OPEN:
+            self._opened_at = now if now is not None else time.monotonic()
+        llm_circuit_state.set(_STATE_VALUES[state], provider=self.name)
+        llm_circuit_transitions.inc(provider=self.name, state=state)
@@ -0,0 +1,95 @@
+import copy
+import os
+import threading
+
+from fpdf import FPDF
+
+# Sharing parsed fonts relies on fpdf2 2.7's internals (requirements.txt pins
+# 2.7.4): font entries are plain dicts and SubsetMap lives in fpdf.fpdf. With
+# other versions the registry falls back to a plain FPDF.add_font per document.
+try:
+    from fpdf.fpdf import SubsetMap
+except ImportError:
+    SubsetMap = None
+
+# TrueType fonts used by ResumePDF, by family name (relative to the working
+# directory, where generate_resume_pdf downloads them)
+RESUME_FONTS = {
+    "DejaVu": "static/fonts/DejaVuSansCondensed.ttf",
+    "DejaVuBold": "static/fonts/DejaVuSansCondensed-Bold.ttf",
+}
+
+
+class FontRegistry:
+    """Parses each TrueType font once per process and shares it across FPDF documents.
+
+    FPDF.add_font reads the whole file with fontTools to build character
+    widths, the cmap and the font descriptor. The registry keeps that result
+    and gives each document its own glyph subset and descriptor, which fpdf
+    fills in as the document is written, so documents stay independent.
+    When the installed fpdf2 does not have the expected internals, fonts are
+    added to each document with FPDF.add_font instead.
+    """
+
+    def __init__(self):
+        self._fonts = {}  # (family, style, path) -> parsed fpdf font entry
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.fallbacks = 0
+
+    def load(self, family, path, style=""):
+        """Return the parsed font, parsing the file on first use"""
+        path = os.path.abspath(path)
+        key = (family, style, path)
+        with self._lock:
+            if key not in self._fonts:
+                # Parse through a scratch document so the entry matches what
+                # this fpdf version builds
+                scratch = FPDF()
+                scratch.add_font(family, style, path)
+                self._fonts[key] = scratch.fonts.get(f"{family.lower()}{style}")
+                self.parsed += 1
+            return self._fonts[key]
+
+    def add_to(self, pdf, family, path, style=""):
+        """Register the font with pdf, like pdf.add_font(family, style, path)"""
+        font = self.load(family, path, style) if SubsetMap is not None else None
+        if not isinstance(font, dict) or "fontkey" not in font:
+            # Not the font entry layout this registry knows how to share
+            with self._lock:
+                self.fallbacks += 1
+            pdf.add_font(family, style, path)
+            return
+        fontkey = font["fontkey"]
+        if fontkey in pdf.fonts:
+            return
+        # Same initial subset as FPDF.add_font
+        chars = "\x00 "
+        if pdf.str_alias_nb_pages:
+            chars += "0123456789" + pdf.str_alias_nb_pages
+        # Character widths are shared read-only; lookups of unknown characters
+        # only add the default width
+        pdf.fonts[fontkey] = dict(
+            font,
+            i=len(pdf.fonts) + 1,
+            desc=copy.copy(font["desc"]),
+            subset=SubsetMap(map(ord, chars)),
+        )
+
+    def preload(self, fonts=RESUME_FONTS):
+        """Parse fonts ahead of the first render; missing files are skipped"""
+        if SubsetMap is None:
+            return 0
+        loaded = 0
+        for family, path in fonts.items():
+            if os.path.exists(path):
+                self.load(family, path)
+                loaded += 1
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            return {"fonts": len(self._fonts), "parsed": self.parsed, "fallbacks": self.fallbacks}
+
+
+font_registry = FontRegistry()
@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import importlib.util
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from groq import DefaultHttpxClient, DefaultAsyncHttpxClient
+
+# Connection pool settings for the LLM client (overridable from the environment)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "10"))
+# HTTP/2 is used when the h2 package is installed, unless disabled here
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1" and importlib.util.find_spec("h2") is not None
+# Connections opened at startup by warm_up()
+LLM_WARM_CONNECTIONS = int(os.getenv("LLM_WARM_CONNECTIONS", "2"))
+
+# Timing of the most recent HTTP call in the current thread or task
+last_call_timing = contextvars.ContextVar("last_call_timing", default=None)
+
+
+class CallTiming:
+    """Per-request timing collected from httpcore trace events.
+
+    queue: waiting for a pooled connection, connect: TCP and TLS setup (0 for
+    a reused connection), ttfb: request sent until response headers arrive,
+    body: reading the response body.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events = {}
+
+    def trace(self, event_name, info):
+        # Event names look like "connection.connect_tcp.started" or
+        # "http11.receive_response_headers.complete"
+        self.events.setdefault(event_name.split(".", 1)[-1], time.perf_counter())
+
+    async def atrace(self, event_name, info):
+        self.trace(event_name, info)
+
+    def _span(self, start, end):
+        if start in self.events and end in self.events:
+            return self.events[end] - self.events[start]
+        return 0.0
+
+    @property
+    def connect(self):
+        return (self._span("connect_tcp.started", "connect_tcp.complete")
+                + self._span("start_tls.started", "start_tls.complete"))
+
+    @property
+    def queue(self):
+        first = self.events.get("connect_tcp.started", self.events.get("send_request_headers.started"))
+        return first - self.started if first is not None else 0.0
+
+    @property
+    def ttfb(self):
+        return self._span("send_request_headers.started", "receive_response_headers.complete")
+
+    @property
+    def body(self):
+        return self._span("receive_response_headers.complete", "receive_response_body.complete")
+
+    @property
+    def reused_connection(self):
+        return "connect_tcp.started" not in self.events
+
+    def as_dict(self):
+        return {
+            "queue": round(self.queue, 4),
+            "connect": round(self.connect, 4),
+            "ttfb": round(self.ttfb, 4),
+            "body": round(self.body, 4),
+            "reused_connection": self.reused_connection,
+        }
+
+    def __repr__(self):
+        return f"CallTiming({self.as_dict()})"
+
+
+def _start_timing(request):
+    timing = CallTiming()
+    request.extensions["trace"] = timing.trace
+    last_call_timing.set(timing)
+
+
+async def _start_timing_async(request):
+    timing = CallTiming()
+    request.extensions["trace"] = timing.atrace
+    last_call_timing.set(timing)
+
+
+def pool_limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def pool_timeout():
+    return httpx.Timeout(
+        connect=LLM_CONNECT_TIMEOUT,
+        read=LLM_READ_TIMEOUT,
+        write=LLM_READ_TIMEOUT,
+        pool=LLM_POOL_TIMEOUT,
+    )
+
+
+def create_http_client(**kwargs):
+    """Shared httpx client for the sync LLM client, with per-call timing"""
+    kwargs.setdefault("limits", pool_limits())
+    kwargs.setdefault("timeout", pool_timeout())
+    kwargs.setdefault("http2", LLM_HTTP2)
+    kwargs.setdefault("event_hooks", {"request": [_start_timing]})
+    return DefaultHttpxClient(**kwargs)
+
+
+def create_async_http_client(**kwargs):
+    """Shared httpx client for the async LLM client, with per-call timing"""
+    kwargs.setdefault("limits", pool_limits())
+    kwargs.setdefault("timeout", pool_timeout())
+    kwargs.setdefault("http2", LLM_HTTP2)
+    kwargs.setdefault("event_hooks", {"request": [_start_timing_async]})
+    return DefaultAsyncHttpxClient(**kwargs)
+
+
+def warm_up(http_client, base_url, connections=LLM_WARM_CONNECTIONS):
+    """Open connections to base_url so the first user request skips TCP/TLS setup"""
+    if connections <= 0:
+        return 0
+
+    def ping(_):
+        try:
+            http_client.head(str(base_url))
+            return 1
+        except httpx.HTTPError as e:
+            logging.error(f"LLM connection warm-up failed: {str(e)}")
+            return 0
+
+    started = time.perf_counter()
+    # With HTTP/2 all requests share one connection
+    count = 1 if LLM_HTTP2 else connections
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        opened = sum(executor.map(ping, range(count)))
+    logging.info(f"Warmed {opened} LLM connection(s) in {time.perf_counter() - started:.3f}s")
+    return opened
+
+
+async def warm_up_async(http_client, base_url, connections=LLM_WARM_CONNECTIONS):
+    """Async version of warm_up"""
+    if connections <= 0:
+        return 0
+
+    async def ping():
+        try:
+            await http_client.head(str(base_url))
+            return 1
+        except httpx.HTTPError as e:
+            logging.error(f"LLM connection warm-up failed: {str(e)}")
+            return 0
+
+    started = time.perf_counter()
+    count = 1 if LLM_HTTP2 else connections
+    opened = sum(await asyncio.gather(*(ping() for _ in range(count))))
+    logging.info(f"Warmed {opened} async LLM connection(s) in {time.perf_counter() - started:.3f}s")
+    return opened
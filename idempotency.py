@@ -0,0 +1,172 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Seconds a completed result is replayed for duplicate requests
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "120"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# Longest a duplicate waits for the original request to finish
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "120"))
+
+
+class IdempotencyCache:
+    """Coalesces requests that share an idempotency key and replays recent results.
+
+    The first request with a key runs; duplicates that arrive while it is in
+    flight wait on the same future, and duplicates within the TTL after it
+    finished get its result. Failures and results rejected by cacheable are
+    shared with waiting duplicates but not kept, so a later retry runs again.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_entries=IDEMPOTENCY_MAX_ENTRIES,
+                 wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self._entries = OrderedDict()  # key -> [future, completed_at or None]
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.replayed = 0
+
+    def begin(self, key):
+        """Return (future, owner); the owner must call finish() or fail() for key"""
+        with self._lock:
+            self._evict(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] is None:
+                    self.coalesced += 1
+                else:
+                    self.replayed += 1
+                return entry[0], False
+            future = Future()
+            self._entries[key] = [future, None]
+            return future, True
+
+    def finish(self, key, result, cache=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if cache:
+                entry[1] = time.monotonic()
+                self._entries.move_to_end(key)
+            else:
+                del self._entries[key]
+        entry[0].set_result(result)
+
+    def fail(self, key, error):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry[0].set_exception(error)
+
+    def _evict(self, now):
+        # Completed entries are kept in completion order; in-flight ones are
+        # never evicted
+        for key, (future, completed_at) in list(self._entries.items()):
+            if completed_at is None:
+                continue
+            if now - completed_at <= self.ttl and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def run(self, key, fn, cacheable=None):
+        """Return fn(), or the result of the request already running under key"""
+        if key is None:
+            return fn()
+        future, owner = self.begin(key)
+        if not owner:
+            return future.result(timeout=self.wait_timeout)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.finish(key, result, cacheable is None or cacheable(result))
+        return result
+
+    async def run_async(self, key, fn, cacheable=None):
+        """Async version of run; fn returns an awaitable"""
+        if key is None:
+            return await fn()
+        future, owner = self.begin(key)
+        if not owner:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.wait_timeout)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.fail(key, e)
+            raise
+        self.finish(key, result, cacheable is None or cacheable(result))
+        return result
+
+    def stream(self, key, start):
+        """Coalesce a stream of ("token" | "done" | "error", data) events.
+
+        Duplicates receive the finished reply as a single token followed by
+        the original "done" or "error" event. Only "done" results are kept.
+        """
+        if key is None:
+            yield from start()
+            return
+        future, owner = self.begin(key)
+        if not owner:
+            yield from _replay(future.result(timeout=self.wait_timeout))
+            return
+        finished = False
+        try:
+            for event, data in start():
+                if event != "token":
+                    self.finish(key, (event, data), cache=event == "done")
+                    finished = True
+                yield event, data
+        finally:
+            if not finished:
+                self.fail(key, RuntimeError("The original request ended before the reply completed"))
+
+    async def astream(self, key, start):
+        """Async version of stream; start returns an async iterator"""
+        if key is None:
+            async for event in start():
+                yield event
+            return
+        future, owner = self.begin(key)
+        if not owner:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), self.wait_timeout)
+            for event in _replay(result):
+                yield event
+            return
+        finished = False
+        try:
+            async for event, data in start():
+                if event != "token":
+                    self.finish(key, (event, data), cache=event == "done")
+                    finished = True
+                yield event, data
+        finally:
+            if not finished:
+                self.fail(key, RuntimeError("The original request ended before the reply completed"))
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(1 for _, completed_at in self._entries.values() if completed_at is None)
+            return {
+                "entries": len(self._entries),
+                "in_flight": in_flight,
+                "coalesced": self.coalesced,
+                "replayed": self.replayed,
+            }
+
+
+def _replay(result):
+    event, data = result
+    if data.get("reply"):
+        yield "token", data["reply"]
+    yield event, data
+
+
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,192 @@
+import json
+import re
+from collections import namedtuple
+
+# Top-level fields of the resume document, used to score candidate objects
+RESUME_FIELDS = frozenset([
+    "name", "title", "summary", "skills", "experience",
+    "education", "certifications", "contact",
+])
+
+# A complete JSON object found in the text; fenced is True when it was
+# inside a ``` code block, start is its offset in the whole text and data is
+# the parsed value (None if it could not be parsed, even after repairs)
+Candidate = namedtuple("Candidate", ["text", "fenced", "start", "data"])
+
+# Characters the scanner has to look at; everything else is skipped
+_INTERESTING = re.compile(r'```|[{}"\\]')
+
+_SMART_QUOTES = str.maketrans({
+    "\u201c": '"', "\u201d": '"', "\u201e": '"', "\u201f": '"',
+    "\u2018": "'", "\u2019": "'",
+})
+
+# Strings are matched first so the fixes below never apply inside them
+_REPAIRS = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[}\]])|\b(True|False|None)\b')
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class JSONExtractor:
+    """Single-pass, incremental scanner for JSON objects in LLM output.
+
+    Text can be fed in arbitrary chunks (e.g. tokens from a stream). Both
+    fenced and bare top-level objects are collected. When an object does not
+    parse, or is still open at a ``` fence or the end of the text, scanning
+    restarts just after its opening brace, so stray braces or backticks in
+    prose cannot swallow the objects after them.
+    """
+
+    def __init__(self):
+        self.candidates = []
+        self._buffer = ""
+        self._offset = 0  # Offset of _buffer[0] in the whole text
+        self._pos = 0
+        self._in_fence = False
+        self._depth = 0
+        self._in_string = False
+        self._object_start = 0
+
+    def feed(self, text):
+        """Scan another chunk and return the objects it completed"""
+        self._buffer += text
+        found = []
+        buffer = self._buffer
+        end = len(buffer)
+
+        while True:
+            match = _INTERESTING.search(buffer, self._pos)
+            if match is None:
+                # Leave a trailing "`" or "``" unscanned in case the next
+                # chunk completes a fence
+                trailing = len(buffer) - len(buffer.rstrip("`"))
+                self._pos = max(self._pos, end - min(trailing, 2))
+                break
+
+            token = match.group()
+            index = match.start()
+
+            if token == "```":
+                if self._depth:
+                    # The unbalanced brace may have been prose; rescan the
+                    # text after it, up to and including this fence
+                    self._pos = self._object_start + 1
+                    self._depth = 0
+                    self._in_string = False
+                    continue
+                self._in_fence = not self._in_fence
+                self._pos = match.end()
+                continue
+
+            if token == "\\":
+                if self._in_string and index + 1 >= end:
+                    # The escaped character has not arrived yet
+                    self._pos = index
+                    break
+                self._pos = index + 2 if self._in_string else index + 1
+                continue
+
+            self._pos = index + 1
+            if token == '"':
+                if self._depth:
+                    self._in_string = not self._in_string
+            elif self._in_string:
+                continue
+            elif token == "{":
+                if self._depth == 0:
+                    self._object_start = index
+                self._depth += 1
+            elif self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    text = buffer[self._object_start:index + 1]
+                    data = parse_json(text)
+                    found.append(Candidate(text, self._in_fence, self._offset + self._object_start, data))
+                    if data is None:
+                        # The opening brace may have been prose
+                        self._pos = self._object_start + 1
+
+        # Drop scanned text that can no longer be part of an object
+        if self._depth == 0:
+            self._offset += self._pos
+            self._buffer = buffer[self._pos:]
+            self._pos = 0
+
+        self.candidates.extend(found)
+        return found
+
+    def finish(self):
+        """Mark the end of the text and return the objects found after an unclosed brace"""
+        found = []
+        while self._depth:
+            # The unclosed brace may have been prose; rescan the text after it
+            self._pos = self._object_start + 1
+            self._depth = 0
+            self._in_string = False
+            found.extend(self.feed(""))
+        return found
+
+    def best(self, fields=RESUME_FIELDS):
+        """Return the parsed candidate that best matches the resume schema, or None.
+
+        Call this once all the text has been fed.
+        """
+        self.finish()
+        return best_match(self.candidates, fields)
+
+
+def repair_json(text):
+    """Fix common LLM JSON mistakes: trailing commas, Python literals and smart quotes"""
+    def fix(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(2) is not None:
+            return match.group(2)
+        return _LITERALS[match.group(3)]
+
+    repaired = _REPAIRS.sub(fix, text)
+    yield repaired
+    smart = repaired.translate(_SMART_QUOTES)
+    if smart != repaired:
+        yield _REPAIRS.sub(fix, smart)
+
+
+def parse_json(text):
+    """Parse a JSON object, repairing it if needed; returns None on failure"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    for attempt in repair_json(text):
+        try:
+            return json.loads(attempt)
+        except ValueError:
+            continue
+    return None
+
+
+def best_match(candidates, fields=RESUME_FIELDS):
+    """Parse candidates and return the one with the most schema fields.
+
+    Ties prefer fenced objects, then the latest one. Objects without any
+    known field are ignored.
+    """
+    best = None
+    best_score = None
+    for candidate in candidates:
+        data = candidate.data
+        if not isinstance(data, dict):
+            continue
+        matched = sum(1 for key in data if key in fields)
+        if not matched:
+            continue
+        score = (matched, candidate.fenced, candidate.start)
+        if best_score is None or score > best_score:
+            best, best_score = data, score
+    return best
+
+
+def extract_json(text, fields=RESUME_FIELDS):
+    """Return the best resume-like JSON object in text, or None"""
+    extractor = JSONExtractor()
+    extractor.feed(text)
+    return extractor.best(fields)
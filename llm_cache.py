@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Completion cache settings (overridable from the environment)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+# Optional SQLite file for a second, persistent cache tier
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB")
+# Completions at or below this temperature are treated as deterministic
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+
+
+def cache_key(model, temperature, messages, **params):
+    """SHA-256 of the canonical JSON form of a completion request"""
+    payload = {"model": model, "temperature": temperature, "messages": messages}
+    payload.update(params)
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Bounded in-memory LRU of completions with an optional SQLite tier"""
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL, db_path=LLM_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._entries = OrderedDict()  # key -> (stored_at, completion)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if db_path:
+            with self._connection() as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS completions ("
+                    "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, completion TEXT NOT NULL)"
+                )
+
+    def get(self, key):
+        """Return the cached completion for key, or None"""
+        now = time.time()
+        completion = self._memory_get(key, now)
+        if completion is not None:
+            return completion
+        return self._disk_result(key, self._disk_get(key, now), now)
+
+    async def get_async(self, key):
+        """Like get, but reads the SQLite tier in a worker thread instead of the event loop"""
+        now = time.time()
+        completion = self._memory_get(key, now)
+        if completion is not None:
+            return completion
+        disk = await asyncio.to_thread(self._disk_get, key, now) if self.db_path else None
+        return self._disk_result(key, disk, now)
+
+    def put(self, key, completion):
+        """Store a completion in every tier"""
+        now = time.time()
+        self._memory_put(key, completion, now)
+        self._disk_put(key, completion, now)
+
+    async def put_async(self, key, completion):
+        """Like put, but writes the SQLite tier in a worker thread instead of the event loop"""
+        now = time.time()
+        self._memory_put(key, completion, now)
+        if self.db_path:
+            await asyncio.to_thread(self._disk_put, key, completion, now)
+
+    def stats(self):
+        """Return a snapshot of cache counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _memory_get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._entries[key]
+        return None
+
+    def _disk_result(self, key, completion, now):
+        # Count a lookup that missed memory, promoting a disk hit
+        with self._lock:
+            if completion is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, completion, now)
+        return completion
+
+    def _memory_put(self, key, completion, now):
+        with self._lock:
+            self._entries[key] = (now, completion)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_get(self, key, now):
+        if not self.db_path:
+            return None
+        try:
+            with self._connection() as db:
+                row = db.execute(
+                    "SELECT stored_at, completion FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[0] > self.ttl:
+                    db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    return None
+                return row[1]
+        except sqlite3.Error as e:
+            logging.error(f"Error reading completion cache: {str(e)}")
+            return None
+
+    def _disk_put(self, key, completion, now):
+        if not self.db_path:
+            return
+        try:
+            with self._connection() as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO completions (key, stored_at, completion) VALUES (?, ?, ?)",
+                    (key, now, completion),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Error writing completion cache: {str(e)}")
+
+    def _connection(self):
+        # One connection per thread; sqlite3 connections are not shareable
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=5)
+            self._local.db = db
+        return db
+
+
+def is_cacheable(temperature, opt_in=False):
+    """Only deterministic completions are cached unless the caller opts in"""
+    return LLM_CACHE_ENABLED and (opt_in or temperature <= LLM_CACHE_MAX_TEMPERATURE)
+
+
+completion_cache = CompletionCache()
@@ -0,0 +1,282 @@
+import asyncio
+import contextvars
+import email.utils
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from groq import APIConnectionError, APIStatusError
+
+# Settings below are read from the environment when a client is built (not
+# at import), so values from .env apply whatever the import order.
+# Local pacing quotas (GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE); 0
+# disables the corresponding bucket
+DEFAULT_REQUESTS_PER_MINUTE = "30"
+DEFAULT_TOKENS_PER_MINUTE = "30000"
+# Give up (with a retry hint) if a call cannot complete within LLM_DEADLINE
+# seconds or after LLM_MAX_RETRIES retries
+DEFAULT_DEADLINE = "30"
+DEFAULT_MAX_RETRIES = "4"
+# Backoff used when the server does not send Retry-After
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 8.0
+# Tokens reserved for the reply when estimating a call's token cost
+# (LLM_REPLY_TOKEN_ESTIMATE)
+DEFAULT_REPLY_TOKEN_ESTIMATE = "512"
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+# Retries made by the most recent call in the current thread or task
+last_call_retries = contextvars.ContextVar("last_call_retries", default=0)
+
+
+class RateLimitExceeded(Exception):
+    """The call could not be made within its deadline; retry_after is a hint in seconds"""
+
+    def __init__(self, retry_after, message=None):
+        self.retry_after = retry_after
+        super().__init__(message or f"Rate limited by the LLM provider, retry in {retry_after:.0f}s")
+
+
+def parse_duration(value):
+    """Parse Groq reset durations such as "7.66s", "2m59.56s" or "120ms" into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers):
+    """Return the Retry-After delay in seconds from response headers, or None"""
+    if headers is None:
+        return None
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_to_datetime(retry_after)
+    if parsed is None:
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def estimate_request_tokens(messages, reply_tokens=None):
+    """Rough token cost of a chat request (about four characters per token)"""
+    if reply_tokens is None:
+        reply_tokens = int(os.getenv("LLM_REPLY_TOKEN_ESTIMATE", DEFAULT_REPLY_TOKEN_ESTIMATE))
+    prompt = sum(len(message.get("content") or "") for message in messages) // 4
+    return prompt + reply_tokens
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at capacity per minute.
+
+    reserve() always takes the tokens, possibly going into debt, and returns
+    how long the caller must wait before using them, so concurrent callers
+    are paced in arrival order.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def refund(self, amount):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def sync(self, remaining, reset_seconds):
+        """Lower the local budget to what the server reports as remaining"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if remaining is not None and remaining < self.tokens:
+                self.tokens = remaining
+            if remaining == 0 and reset_seconds:
+                # Nothing left until the server-side window resets
+                self.tokens = min(self.tokens, -reset_seconds * self.rate)
+
+
+class RateLimits:
+    """Local request/token buckets kept in line with x-ratelimit-* response headers"""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        if requests_per_minute is None:
+            requests_per_minute = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE))
+        if tokens_per_minute is None:
+            tokens_per_minute = float(os.getenv("GROQ_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE))
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.last_headers = {}
+
+    def reserve(self, tokens):
+        """Reserve one request and tokens; returns the seconds to wait"""
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def refund(self, tokens):
+        if self.requests:
+            self.requests.refund(1)
+        if self.tokens:
+            self.tokens.refund(tokens)
+
+    def update_from_headers(self, headers):
+        if headers is None:
+            return
+        limits = {name: value for name, value in headers.items() if name.lower().startswith("x-ratelimit-")}
+        if not limits:
+            return
+        self.last_headers = limits
+        for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            if bucket is None:
+                continue
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                remaining = float(remaining) if remaining is not None else None
+            except ValueError:
+                remaining = None
+            bucket.sync(remaining, parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+
+
+class _RateLimitedBase:
+    def __init__(self, client, limits=None, deadline=None, max_retries=None):
+        self.client = client
+        self.limits = limits or RateLimits()
+        self.deadline = deadline if deadline is not None else float(os.getenv("LLM_DEADLINE", DEFAULT_DEADLINE))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        self.reply_tokens = int(os.getenv("LLM_REPLY_TOKEN_ESTIMATE", DEFAULT_REPLY_TOKEN_ESTIMATE))
+        self.total_retries = 0
+        self.rate_limited = 0
+
+    def stats(self):
+        """Return retry counters and the latest rate-limit headers"""
+        return {
+            "retries": self.total_retries,
+            "rate_limited": self.rate_limited,
+            "rate_limit_headers": dict(self.limits.last_headers),
+        }
+
+    def _pace(self, tokens, deadline):
+        # Seconds to wait before sending, or RateLimitExceeded if that would
+        # run past the deadline
+        wait = self.limits.reserve(tokens)
+        if time.monotonic() + wait > deadline:
+            self.limits.refund(tokens)
+            self.rate_limited += 1
+            raise RateLimitExceeded(wait)
+        return wait
+
+    def _retry_delay(self, error, attempt, deadline):
+        # Seconds to wait before retrying error, or re-raise it
+        if isinstance(error, APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS_CODES:
+                raise error
+            self.limits.update_from_headers(error.response.headers)
+            retry_after = parse_retry_after(error.response.headers)
+        elif isinstance(error, APIConnectionError):
+            retry_after = None
+        else:
+            raise error
+
+        backoff = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (attempt - 1))
+        delay = (retry_after if retry_after is not None else backoff) * random.uniform(1.0, 1.25)
+        is_rate_limit = isinstance(error, APIStatusError) and error.status_code == 429
+
+        if attempt > self.max_retries or time.monotonic() + delay > deadline:
+            if is_rate_limit:
+                self.rate_limited += 1
+                raise RateLimitExceeded(delay) from error
+            raise error
+
+        logging.debug(f"LLM call failed ({error}); retry {attempt} in {delay:.2f}s")
+        last_call_retries.set(attempt)
+        self.total_retries += 1
+        return delay
+
+    def _completed(self, raw):
+        self.limits.update_from_headers(raw.headers)
+        return raw.parse()
+
+
+class RateLimitedClient(_RateLimitedBase):
+    """Wraps a Groq client's chat completions with pacing, Retry-After handling and a deadline"""
+
+    def create(self, **params):
+        deadline = time.monotonic() + self.deadline
+        tokens = estimate_request_tokens(params.get("messages", []), self.reply_tokens)
+        last_call_retries.set(0)
+        attempt = 0
+        while True:
+            wait = self._pace(tokens, deadline)
+            if wait:
+                time.sleep(wait)
+            try:
+                raw = self.client.chat.completions.with_raw_response.create(**params)
+                return self._completed(raw)
+            except (APIStatusError, APIConnectionError) as e:
+                attempt += 1
+                time.sleep(self._retry_delay(e, attempt, deadline))
+
+
+class AsyncRateLimitedClient(_RateLimitedBase):
+    """Async version of RateLimitedClient for an AsyncGroq client"""
+
+    async def create(self, **params):
+        deadline = time.monotonic() + self.deadline
+        tokens = estimate_request_tokens(params.get("messages", []), self.reply_tokens)
+        last_call_retries.set(0)
+        attempt = 0
+        while True:
+            wait = self._pace(tokens, deadline)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                raw = await self.client.chat.completions.with_raw_response.create(**params)
+                return await self._completed(raw)
+            except (APIStatusError, APIConnectionError) as e:
+                attempt += 1
+                await asyncio.sleep(self._retry_delay(e, attempt, deadline))
+
+    async def _completed(self, raw):
+        self.limits.update_from_headers(raw.headers)
+        return await raw.parse()
@@ -0,0 +1,349 @@
+import contextvars
+import logging
+import os
+from collections import namedtuple
+
+from groq import Groq, AsyncGroq, APIConnectionError, APIStatusError
+
+from circuit_breaker import CircuitBreaker, breaker_enabled
+from http_pool import create_http_client, create_async_http_client, warm_up, warm_up_async
+from llm_client import RateLimitedClient, AsyncRateLimitedClient, RateLimits, RateLimitExceeded
+from metrics import llm_fallback_calls
+
+# Default address of the local OpenAI-compatible server (stub_server.py)
+# used by the "stub" provider; overridden by LLM_BASE_URL
+DEFAULT_STUB_BASE_URL = "http://127.0.0.1:8001"
+
+# Result of a non-streamed completion; usage is the provider's token usage
+# object (or None when it was not reported)
+ChatResult = namedtuple("ChatResult", ["text", "usage"])
+
+# Token usage reported by the most recent stream in the current thread or task
+last_stream_usage = contextvars.ContextVar("last_stream_usage", default=None)
+
+
+def _chunk_usage(chunk):
+    # Groq reports usage on the final chunk under x_groq; OpenAI-style servers
+    # use a top-level usage field
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        x_groq = getattr(chunk, "x_groq", None)
+        # Older SDKs keep unknown fields as plain dicts
+        usage = x_groq.get("usage") if isinstance(x_groq, dict) else getattr(x_groq, "usage", None)
+    return usage
+
+
+class LLMProvider:
+    """Interface for chat completion backends"""
+
+    name = "base"
+
+    def chat(self, messages, model, temperature, **params):
+        """Return a ChatResult for messages"""
+        raise NotImplementedError
+
+    def stream(self, messages, model, temperature, **params):
+        """Yield the reply as text tokens, setting last_stream_usage when it is reported"""
+        raise NotImplementedError
+
+    async def achat(self, messages, model, temperature, **params):
+        """Async version of chat"""
+        raise NotImplementedError
+
+    async def astream(self, messages, model, temperature, **params):
+        """Async version of stream"""
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    def warm_up(self):
+        """Open connections before the first request; returns how many were opened"""
+        return 0
+
+    async def warm_up_async(self):
+        return 0
+
+    def stats(self):
+        return {"provider": self.name}
+
+
+class GroqProvider(LLMProvider):
+    """Groq SDK backend with pooled connections and rate-limit-aware retries.
+
+    base_url lets the same client talk to any OpenAI-compatible server that
+    mirrors Groq's /openai/v1 routes, such as the local stub server.
+    """
+
+    name = "groq"
+
+    def __init__(self, api_key, base_url=None, limits=None):
+        self.api_key = api_key
+        self.http_client = create_http_client()
+        self.async_http_client = create_async_http_client()
+        self.client = None
+        self.async_client = None
+        if api_key:
+            # Retries are handled by the rate-limit-aware wrappers, not the SDK
+            self.client = Groq(api_key=api_key, base_url=base_url, max_retries=0,
+                               http_client=self.http_client)
+            self.async_client = AsyncGroq(api_key=api_key, base_url=base_url, max_retries=0,
+                                          http_client=self.async_http_client)
+        self.llm = RateLimitedClient(self.client, limits=limits)
+        self.async_llm = AsyncRateLimitedClient(self.async_client, limits=limits)
+
+    def _check_configured(self):
+        if self.client is None:
+            raise ValueError("GROQ_API_KEY not found")
+
+    def chat(self, messages, model, temperature, **params):
+        self._check_configured()
+        response = self.llm.create(model=model, messages=messages, temperature=temperature, **params)
+        return ChatResult(response.choices[0].message.content, response.usage)
+
+    def stream(self, messages, model, temperature, **params):
+        self._check_configured()
+        stream = self.llm.create(model=model, messages=messages, temperature=temperature,
+                                 stream=True, **params)
+        last_stream_usage.set(None)
+        for chunk in stream:
+            usage = _chunk_usage(chunk)
+            if usage is not None:
+                last_stream_usage.set(usage)
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
+    async def achat(self, messages, model, temperature, **params):
+        self._check_configured()
+        response = await self.async_llm.create(model=model, messages=messages,
+                                               temperature=temperature, **params)
+        return ChatResult(response.choices[0].message.content, response.usage)
+
+    async def astream(self, messages, model, temperature, **params):
+        self._check_configured()
+        stream = await self.async_llm.create(model=model, messages=messages,
+                                             temperature=temperature, stream=True, **params)
+        last_stream_usage.set(None)
+        async for chunk in stream:
+            usage = _chunk_usage(chunk)
+            if usage is not None:
+                last_stream_usage.set(usage)
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
+    def warm_up(self):
+        if self.client is None:
+            return 0
+        return warm_up(self.http_client, self.client.base_url)
+
+    async def warm_up_async(self):
+        if self.async_client is None:
+            return 0
+        return await warm_up_async(self.async_http_client, self.async_client.base_url)
+
+    def stats(self):
+        stats = {"provider": self.name}
+        stats.update(self.llm.stats())
+        return stats
+
+
+def is_upstream_failure(error):
+    """Whether error means the provider is unavailable, rather than a bad request"""
+    if isinstance(error, (RateLimitExceeded, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (403, 429) or error.status_code >= 500
+    return False
+
+
+class CircuitBreakerProvider(LLMProvider):
+    """Wraps a provider in a circuit breaker, with an optional fallback.
+
+    While the circuit is open, calls go to the fallback provider (using
+    fallback_model when set) or fail fast with CircuitOpenError. Upstream
+    failures of the primary also fall back, unless a stream had already
+    produced tokens.
+    """
+
+    def __init__(self, primary, breaker=None, fallback=None, fallback_model=None):
+        self.primary = primary
+        self.name = primary.name
+        self.breaker = breaker or CircuitBreaker(primary.name)
+        self.fallback = fallback
+        self.fallback_model = fallback_model
+
+    def _settle(self, error=None):
+        if error is None:
+            self.breaker.record_success()
+        elif is_upstream_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    def _fallback_for(self, reason, error=None):
+        # Returns the fallback provider, or raises when there is none
+        if self.fallback is None or (error is not None and not is_upstream_failure(error)):
+            raise error or self.breaker.error()
+        logging.warning(f"Using fallback LLM provider {self.fallback.name} ({reason})")
+        llm_fallback_calls.inc(provider=self.fallback.name, reason=reason)
+        return self.fallback
+
+    def _fallback_model(self, model):
+        return self.fallback_model or model
+
+    def chat(self, messages, model, temperature, **params):
+        if not self.breaker.allow():
+            fallback = self._fallback_for("open")
+            return fallback.chat(messages, self._fallback_model(model), temperature, **params)
+        try:
+            result = self.primary.chat(messages, model, temperature, **params)
+        except Exception as e:
+            self._settle(e)
+            fallback = self._fallback_for("error", e)
+            return fallback.chat(messages, self._fallback_model(model), temperature, **params)
+        self._settle()
+        return result
+
+    def stream(self, messages, model, temperature, **params):
+        if not self.breaker.allow():
+            fallback = self._fallback_for("open")
+            yield from fallback.stream(messages, self._fallback_model(model), temperature, **params)
+            return
+        started = False
+        settled = False
+        try:
+            for token in self.primary.stream(messages, model, temperature, **params):
+                started = True
+                yield token
+        except Exception as e:
+            self._settle(e)
+            settled = True
+            if started:
+                raise
+            fallback = self._fallback_for("error", e)
+            yield from fallback.stream(messages, self._fallback_model(model), temperature, **params)
+            return
+        else:
+            self._settle()
+            settled = True
+        finally:
+            if not settled:
+                # Abandoned by the caller; tokens arriving show the provider is up
+                if started:
+                    self._settle()
+                else:
+                    self.breaker.release()
+
+    async def achat(self, messages, model, temperature, **params):
+        if not self.breaker.allow():
+            fallback = self._fallback_for("open")
+            return await fallback.achat(messages, self._fallback_model(model), temperature, **params)
+        try:
+            result = await self.primary.achat(messages, model, temperature, **params)
+        except Exception as e:
+            self._settle(e)
+            fallback = self._fallback_for("error", e)
+            return await fallback.achat(messages, self._fallback_model(model), temperature, **params)
+        self._settle()
+        return result
+
+    async def astream(self, messages, model, temperature, **params):
+        if not self.breaker.allow():
+            fallback = self._fallback_for("open")
+            async for token in fallback.astream(messages, self._fallback_model(model), temperature, **params):
+                yield token
+            return
+        started = False
+        settled = False
+        try:
+            async for token in self.primary.astream(messages, model, temperature, **params):
+                started = True
+                yield token
+        except Exception as e:
+            self._settle(e)
+            settled = True
+            if started:
+                raise
+            fallback = self._fallback_for("error", e)
+            async for token in fallback.astream(messages, self._fallback_model(model), temperature, **params):
+                yield token
+            return
+        else:
+            self._settle()
+            settled = True
+        finally:
+            if not settled:
+                # Abandoned by the caller; tokens arriving show the provider is up
+                if started:
+                    self._settle()
+                else:
+                    self.breaker.release()
+
+    def warm_up(self):
+        opened = self.primary.warm_up()
+        if self.fallback is not None:
+            opened += self.fallback.warm_up()
+        return opened
+
+    async def warm_up_async(self):
+        opened = await self.primary.warm_up_async()
+        if self.fallback is not None:
+            opened += await self.fallback.warm_up_async()
+        return opened
+
+    def stats(self):
+        stats = self.primary.stats()
+        stats["circuit"] = self.breaker.stats()
+        if self.fallback is not None:
+            stats["fallback"] = self.fallback.stats()
+        return stats
+
+
+def create_provider(name=None):
+    """Build the provider named by LLM_PROVIDER: "groq" (default) or "stub".
+
+    Unless LLM_BREAKER_ENABLED is 0, it is wrapped in a circuit breaker that
+    falls back to LLM_FALLBACK_PROVIDER (with LLM_FALLBACK_MODEL, if set)
+    while the circuit is open. The fallback can point at its own server and
+    account with LLM_FALLBACK_BASE_URL and LLM_FALLBACK_API_KEY; the server
+    has to serve Groq's OpenAI-compatible /openai/v1 routes. These settings,
+    the LLM_BREAKER_* thresholds and the rate limits are read when this is
+    called, not at import.
+    """
+    provider = _create_base_provider(name or os.getenv("LLM_PROVIDER", "groq"))
+    if not breaker_enabled():
+        return provider
+    fallback_name = os.getenv("LLM_FALLBACK_PROVIDER")
+    fallback = None
+    if fallback_name:
+        fallback = _create_base_provider(fallback_name, api_key=os.getenv("LLM_FALLBACK_API_KEY"),
+                                         base_url=os.getenv("LLM_FALLBACK_BASE_URL"))
+    return CircuitBreakerProvider(provider, fallback=fallback,
+                                  fallback_model=os.getenv("LLM_FALLBACK_MODEL"))
+
+
+def _create_base_provider(name, api_key=None, base_url=None):
+    # api_key and base_url override GROQ_API_KEY and the provider's default
+    # server (Groq's API, or LLM_BASE_URL for the stub)
+    if name == "groq":
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        if not api_key:
+            logging.error("GROQ_API_KEY not found in environment variables")
+        else:
+            logging.debug("GROQ_API_KEY found in environment variables")
+        if base_url:
+            logging.info(f"Using Groq-compatible LLM provider at {base_url}")
+        return GroqProvider(api_key, base_url=base_url)
+    if name == "stub":
+        base_url = base_url or os.getenv("LLM_BASE_URL", DEFAULT_STUB_BASE_URL)
+        logging.info(f"Using stub LLM provider at {base_url}")
+        # The stub has no quota, so local pacing is turned off
+        provider = GroqProvider(api_key or os.getenv("GROQ_API_KEY") or "stub", base_url=base_url,
+                                limits=RateLimits(requests_per_minute=0, tokens_per_minute=0))
+        provider.name = "stub"
+        return provider
+    raise ValueError(f"Unknown LLM provider: {name}")
@@ -0,0 +1,224 @@
+import bisect
+import threading
+
+# Bucket upper bounds; +Inf is always added
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+RETRY_BUCKETS = (0, 1, 2, 3, 4, 8)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}  # sorted label tuple -> value
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """Value that can go up and down, optionally split by labels"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}  # sorted label tuple -> value
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # sorted label tuple -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(sorted(labels.items())))
+        return series[-1] if series else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            series_items = [(key, list(series)) for key, series in sorted(self._series.items())]
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, series[-2]))
+            samples.append((f"{self.name}_count", key, series[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Per-call LLM metrics, labelled by mode ("chat" or "stream") and model route
+# ("chat" or "extract")
+llm_requests = registry.counter(
+    "llm_requests_total", "Chat turns by mode, route and outcome (ok, error, cache_hit)")
+llm_prompt_tokens = registry.histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call", TOKEN_BUCKETS)
+llm_completion_tokens = registry.histogram(
+    "llm_completion_tokens", "Completion tokens per LLM call", TOKEN_BUCKETS)
+llm_total_tokens = registry.histogram(
+    "llm_total_tokens", "Total tokens per LLM call", TOKEN_BUCKETS)
+llm_queue_seconds = registry.histogram(
+    "llm_queue_seconds", "Time waiting for a pooled HTTP connection")
+llm_ttfb_seconds = registry.histogram(
+    "llm_ttfb_seconds", "Time from sending the request to the response headers")
+llm_latency_seconds = registry.histogram(
+    "llm_latency_seconds", "Total LLM call latency including pacing and retries")
+llm_retries = registry.histogram(
+    "llm_retries", "Retries per LLM call", RETRY_BUCKETS)
+resume_extractions = registry.counter(
+    "resume_extractions_total", "Resume JSON extraction attempts by route and result (merged, failed, none)")
+resume_repairs = registry.counter(
+    "resume_repairs_total", "Repair calls for extraction output that failed validation, by result (ok, failed)")
+
+llm_circuit_state = registry.gauge(
+    "llm_circuit_state", "Circuit breaker state per provider (0 closed, 1 half-open, 2 open)")
+llm_circuit_transitions = registry.counter(
+    "llm_circuit_transitions_total", "Circuit breaker state changes by provider and new state")
+llm_circuit_rejected = registry.counter(
+    "llm_circuit_rejected_total", "LLM calls not sent to a provider because its circuit was open")
+llm_fallback_calls = registry.counter(
+    "llm_fallback_calls_total", "Calls served by the fallback provider, by reason (open, error)")
+
+pdf_cache_requests = registry.counter(
+    "pdf_cache_requests_total", "Resume PDF requests by cache result (memory_hit, disk_hit, miss, coalesced)")
+pdf_render_seconds = registry.histogram(
+    "pdf_render_seconds", "Time to render a resume PDF, by renderer")
+
+pdf_render_jobs = registry.counter(
+    "pdf_render_jobs_total", "PDF render pool jobs by result (ok, failed, timeout, crashed)")
+pdf_render_queue_depth = registry.gauge(
+    "pdf_render_queue_depth", "PDF render jobs queued or running")
+pdf_render_rejected = registry.counter(
+    "pdf_render_rejected_total", "PDF renders rejected because the render queue was full")
+
+pdf_render_job_states = registry.counter(
+    "pdf_render_job_states_total", "Render job state changes by new state (queued, running, done, failed)")
+
+
+def record_llm_call(mode, route, latency, usage=None, timing=None, retries=0):
+    """Record one completed LLM call; usage and timing may be None"""
+    llm_requests.inc(mode=mode, route=route, outcome="ok")
+    llm_latency_seconds.observe(latency, mode=mode, route=route)
+    llm_retries.observe(retries, mode=mode, route=route)
+    if timing is not None:
+        llm_queue_seconds.observe(timing.queue, mode=mode, route=route)
+        llm_ttfb_seconds.observe(timing.ttfb, mode=mode, route=route)
+    if usage is not None:
+        if isinstance(usage, dict):
+            prompt = usage.get("prompt_tokens") or 0
+            completion = usage.get("completion_tokens") or 0
+            total = usage.get("total_tokens") or prompt + completion
+        else:
+            prompt = getattr(usage, "prompt_tokens", None) or 0
+            completion = getattr(usage, "completion_tokens", None) or 0
+            total = getattr(usage, "total_tokens", None) or prompt + completion
+        llm_prompt_tokens.observe(prompt, mode=mode, route=route)
+        llm_completion_tokens.observe(completion, mode=mode, route=route)
+        llm_total_tokens.observe(total, mode=mode, route=route)
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from idempotency import IdempotencyCache, IDEMPOTENCY_WAIT_TIMEOUT
+from metrics import pdf_cache_requests, pdf_render_seconds
+from pdf_generator import RENDERER_VERSIONS
+from resume_schema import normalize_resume
+
+# Recently rendered PDFs are also kept in memory (overridable from the environment)
+PDF_CACHE_MEMORY_ENTRIES = int(os.getenv("PDF_CACHE_MEMORY_ENTRIES", "128"))
+PDF_CACHE_MEMORY_TTL = float(os.getenv("PDF_CACHE_MEMORY_TTL", "300"))
+# Write PDFs rendered for inline responses to disk in the background
+PDF_CACHE_WRITE_BEHIND = os.getenv("PDF_CACHE_WRITE_BEHIND", "1") == "1"
+# Cached PDF files unused for this many seconds are deleted (0 keeps them);
+# keep it above PDF_JOB_TTL so finished jobs' download links stay valid
+PDF_CACHE_DISK_TTL = float(os.getenv("PDF_CACHE_DISK_TTL", str(24 * 3600)))
+# Least recently used files are deleted while the cache is larger (0: no limit)
+PDF_CACHE_DISK_MAX_BYTES = int(os.getenv("PDF_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Seconds between sweeps of the cache directory
+PDF_CACHE_SWEEP_INTERVAL = float(os.getenv("PDF_CACHE_SWEEP_INTERVAL", "300"))
+
+# Files the cache owns; anything else in the directory is left alone
+_CACHE_FILE = re.compile(r"^resume_[0-9a-f]{64}\.pdf$")
+
+
+def pdf_key(resume, renderer="simple", theme=None):
+    """SHA-256 of the canonical JSON form of a resume and how it is rendered.
+
+    The resume is normalized first, so field order and equivalent spellings
+    (like "Python, SQL" and ["Python", "SQL"]) give the same key in every
+    process.
+    """
+    payload = {
+        "resume": normalize_resume(resume),
+        "renderer": renderer,
+        "version": RENDERER_VERSIONS[renderer],
+        "theme": theme,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PDFCache:
+    """Content-addressed resume PDFs, in memory and on disk.
+
+    A PDF is rendered only when neither tier has its key. Concurrent
+    requests for the same key in this process wait for one render, and the
+    bytes stay in memory for a while afterwards. Files are written to a
+    temporary name and renamed into place, so other processes never see a
+    partial PDF.
+
+    A background sweep deletes files unused for longer than disk_ttl, then
+    the least recently used ones while the directory holds more than
+    disk_max_bytes. Disk hits refresh a file's modification time, which
+    serves as its last use.
+    """
+
+    def __init__(self, directory, write_behind=PDF_CACHE_WRITE_BEHIND,
+                 memory_entries=PDF_CACHE_MEMORY_ENTRIES, memory_ttl=PDF_CACHE_MEMORY_TTL,
+                 wait_timeout=IDEMPOTENCY_WAIT_TIMEOUT, disk_ttl=PDF_CACHE_DISK_TTL,
+                 disk_max_bytes=PDF_CACHE_DISK_MAX_BYTES, sweep_interval=PDF_CACHE_SWEEP_INTERVAL):
+        self.directory = directory
+        self.write_behind = write_behind
+        self.disk_ttl = disk_ttl
+        self.disk_max_bytes = disk_max_bytes
+        self.sweep_interval = sweep_interval
+        self.evicted = 0
+        # Coalesces in-flight renders and replays recent ones
+        self._recent = IdempotencyCache(ttl=memory_ttl, max_entries=memory_entries,
+                                        wait_timeout=wait_timeout)
+        self._writer = None
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"resume_{key}.pdf")
+
+    def get_bytes(self, key, render, renderer="simple"):
+        """Return the PDF for key, calling render() for its bytes if needed.
+
+        render returns the PDF bytes, or None on failure. Fresh renders are
+        written to disk in the background when write-behind is on.
+        """
+        future, owner = self._recent.begin(key)
+        if not owner:
+            pdf_cache_requests.inc(result="memory_hit" if future.done() else "coalesced")
+            return future.result(timeout=self._recent.wait_timeout)
+        try:
+            pdf_bytes, rendered = self._load_or_render(key, render, renderer)
+        except BaseException as e:
+            self._recent.fail(key, e)
+            raise
+        self._recent.finish(key, pdf_bytes, cache=pdf_bytes is not None)
+        if rendered and self.write_behind:
+            self._get_writer().submit(self._write, key, pdf_bytes)
+        return pdf_bytes
+
+    def get_path(self, key, render, renderer="simple"):
+        """Return the path of the PDF for key on disk, rendering and writing it if needed"""
+        path = self.path_for(key)
+        if self._touch(path):
+            pdf_cache_requests.inc(result="disk_hit")
+            return path
+        pdf_bytes = self.get_bytes(key, render, renderer)
+        if pdf_bytes is None:
+            return None
+        # The write-behind may not have run yet
+        if not os.path.exists(path):
+            self._write(key, pdf_bytes)
+        return path
+
+    def _load_or_render(self, key, render, renderer):
+        # Returns (pdf_bytes, whether they were rendered now)
+        try:
+            with open(self.path_for(key), "rb") as f:
+                pdf_bytes = f.read()
+            self._touch(self.path_for(key))
+            pdf_cache_requests.inc(result="disk_hit")
+            return pdf_bytes, False
+        except FileNotFoundError:
+            pass
+        pdf_cache_requests.inc(result="miss")
+        started = time.perf_counter()
+        pdf_bytes = render()
+        if pdf_bytes is None:
+            return None, False
+        pdf_render_seconds.observe(time.perf_counter() - started, renderer=renderer)
+        return pdf_bytes, True
+
+    def _write(self, key, pdf_bytes):
+        self._start_sweeper()
+        path = self.path_for(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(temp_path, path)
+            logging.debug(f"Wrote {path}")
+        except OSError as e:
+            logging.error(f"Error writing cached PDF {path}: {str(e)}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def sweep(self, now=None):
+        """Delete expired files, then the least recently used ones over the size limit; returns how many"""
+        now = time.time() if now is None else now
+        files = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not _CACHE_FILE.match(entry.name):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Deleted by another process meanwhile
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logging.error(f"Error listing PDF cache {self.directory}: {str(e)}")
+            return 0
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            expired = self.disk_ttl > 0 and now - mtime > self.disk_ttl
+            if not expired and not (self.disk_max_bytes > 0 and total > self.disk_max_bytes):
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Error deleting cached PDF {path}: {str(e)}")
+                continue
+            total -= size
+        if removed:
+            self.evicted += removed
+            logging.debug(f"Deleted {removed} cached PDFs from {self.directory}")
+        return removed
+
+    def stats(self):
+        return {"memory": self._recent.stats(), "disk_evicted": self.evicted}
+
+    def _touch(self, path):
+        # Mark a file as used now; False if it is not there
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError:
+            return os.path.exists(path)
+
+    def _start_sweeper(self):
+        # The thread starts with the first file written, not at import
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="pdf-cache-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            self.sweep()
+            time.sleep(self.sweep_interval)
+
+    def _get_writer(self):
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-write-behind")
+        return self._writer
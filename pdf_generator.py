@@ -1,9 +1,15 @@
 from fpdf import FPDF
-import json
 import os
 import traceback
 import urllib.request
 
+from font_registry import font_registry, RESUME_FONTS
+from resume_schema import Resume, parse_resume
+
+# Bump a renderer's version when its layout changes, so cached PDFs made by
+# the old layout are not served
+RENDERER_VERSIONS = {"simple": 1, "styled": 1}
+
 class ResumePDF:
     def __init__(self, margin=10):
         self.pdf = FPDF()
@@ -12,13 +18,12 @@ class ResumePDF:
         
         # Set default font (use Helvetica if DejaVu fonts are unavailable)
         self.font_available = False
-        font_path = 'static/fonts/DejaVuSansCondensed.ttf'
-        bold_font_path = 'static/fonts/DejaVuSansCondensed-Bold.ttf'
         
-        if os.path.exists(font_path) and os.path.exists(bold_font_path):
+        if all(os.path.exists(path) for path in RESUME_FONTS.values()):
             try:
-                self.pdf.add_font('DejaVu', '', font_path, uni=True)
-                self.pdf.add_font('DejaVuBold', '', bold_font_path, uni=True)
+                # Parsed once per process and shared by every document
+                for family, path in RESUME_FONTS.items():
+                    font_registry.add_to(self.pdf, family, path)
                 self.font_available = True
             except Exception as e:
                 print(f"Failed to load DejaVu fonts: {str(e)}")
@@ -54,14 +59,14 @@ class ResumePDF:
         self.pdf.set_font(font, '', 10)
         
         contact_text = ""
-        if 'email' in contact:
-            contact_text += f"Email: {contact['email']}   "
-        if 'phone' in contact:
-            contact_text += f"Phone: {contact['phone']}   "
-        if 'linkedin' in contact:
-            contact_text += f"LinkedIn: {contact['linkedin']}   "
-        if 'website' in contact:
-            contact_text += f"Website: {contact['website']}"
+        if contact.email:
+            contact_text += f"Email: {contact.email}   "
+        if contact.phone:
+            contact_text += f"Phone: {contact.phone}   "
+        if contact.linkedin:
+            contact_text += f"LinkedIn: {contact.linkedin}   "
+        if contact.website:
+            contact_text += f"Website: {contact.website}"
             
         self.pdf.cell(0, 5, contact_text, ln=True, align='C')
         self.pdf.ln(5)
@@ -81,7 +86,7 @@ class ResumePDF:
         self.add_section_heading("Professional Summary")
         font = 'DejaVu' if self.font_available else 'Helvetica'
         self.pdf.set_font(font, '', 11)
-        self.pdf.multi_cell(0, 5, str(summary))
+        self.pdf.multi_cell(0, 5, summary)
         self.pdf.ln(5)
         
     def add_skills(self, skills):
@@ -92,13 +97,7 @@ class ResumePDF:
         self.add_section_heading("Skills")
         font = 'DejaVu' if self.font_available else 'Helvetica'
         self.pdf.set_font(font, '', 11)
-        
-        if isinstance(skills, list):
-            skills_text = ", ".join(str(skill) for skill in skills)
-        else:
-            skills_text = str(skills)
-            
-        self.pdf.multi_cell(0, 5, skills_text)
+        self.pdf.multi_cell(0, 5, ", ".join(skills))
         self.pdf.ln(5)
         
     def add_experience(self, experience):
@@ -107,48 +106,30 @@ class ResumePDF:
             return
             
         self.add_section_heading("Work Experience")
+        regular = 'DejaVu' if self.font_available else 'Helvetica'
+        bold = 'DejaVuBold' if self.font_available else 'Helvetica'
         
-        if isinstance(experience, list):
-            for job in experience:
-                if isinstance(job, dict):
-                    font = 'DejaVuBold' if self.font_available else 'Helvetica'
-                    self.pdf.set_font(font, '', 12)
-                    position = job.get('position', '')
-                    company = job.get('company', '')
-                    job_header = f"{position} at {company}"
-                    self.pdf.cell(0, 6, job_header, ln=True)
-                    
-                    font = 'DejaVu' if self.font_available else 'Helvetica'
-                    self.pdf.set_font(font, '', 10)
-                    date_range = f"{job.get('start_date', '')} - {job.get('end_date', 'Present')}"
-                    location = job.get('location', '')
-                    date_loc = f"{date_range} | {location}" if location else date_range
-                    self.pdf.cell(0, 5, date_loc, ln=True)
-                    
-                    self.pdf.ln(2)
-                    self.pdf.set_font(font, '', 11)
-                    description = job.get('description', '')
-                    self.pdf.multi_cell(0, 5, str(description))
-                    
-                    if 'achievements' in job and job['achievements']:
-                        self.pdf.ln(2)
-                        achievements = job['achievements']
-                        if isinstance(achievements, list):
-                            for achievement in achievements:
-                                self.pdf.cell(5, 5, chr(8226), ln=0)
-                                self.pdf.multi_cell(0, 5, f" {str(achievement)}")
-                        else:
-                            self.pdf.multi_cell(0, 5, str(achievements))
-                else:
-                    font = 'DejaVu' if self.font_available else 'Helvetica'
-                    self.pdf.set_font(font, '', 11)
-                    self.pdf.multi_cell(0, 5, str(job))
+        for job in experience:
+            if job.position or job.company:
+                self.pdf.set_font(bold, '', 12)
+                self.pdf.cell(0, 6, f"{job.position} at {job.company}", ln=True)
                 
-                self.pdf.ln(5)
-        else:
-            font = 'DejaVu' if self.font_available else 'Helvetica'
-            self.pdf.set_font(font, '', 11)
-            self.pdf.multi_cell(0, 5, str(experience))
+                self.pdf.set_font(regular, '', 10)
+                date_range = f"{job.start_date} - {job.end_date or 'Present'}"
+                date_loc = f"{date_range} | {job.location}" if job.location else date_range
+                self.pdf.cell(0, 5, date_loc, ln=True)
+                self.pdf.ln(2)
+                
+            self.pdf.set_font(regular, '', 11)
+            self.pdf.multi_cell(0, 5, job.description)
+            
+            if job.achievements:
+                self.pdf.ln(2)
+                for achievement in job.achievements:
+                    self.pdf.cell(5, 5, chr(8226), ln=0)
+                    self.pdf.multi_cell(0, 5, f" {achievement}")
+            
+            self.pdf.ln(5)
             
         self.pdf.ln(5)
         
@@ -158,38 +139,25 @@ class ResumePDF:
             return
             
         self.add_section_heading("Education")
+        regular = 'DejaVu' if self.font_available else 'Helvetica'
+        bold = 'DejaVuBold' if self.font_available else 'Helvetica'
         
-        if isinstance(education, list):
-            for edu in education:
-                if isinstance(edu, dict):
-                    font = 'DejaVuBold' if self.font_available else 'Helvetica'
-                    self.pdf.set_font(font, '', 12)
-                    degree = edu.get('degree', '')
-                    institution = edu.get('institution', '')
-                    edu_header = f"{degree}, {institution}"
-                    self.pdf.cell(0, 6, edu_header, ln=True)
-                    
-                    font = 'DejaVu' if self.font_available else 'Helvetica'
-                    self.pdf.set_font(font, '', 10)
-                    date_range = f"{edu.get('start_date', '')} - {edu.get('end_date', '')}"
-                    location = edu.get('location', '')
-                    date_loc = f"{date_range} | {location}" if location else date_range
-                    self.pdf.cell(0, 5, date_loc, ln=True)
-                    
-                    if 'description' in edu and edu['description']:
-                        self.pdf.ln(2)
-                        self.pdf.set_font(font, '', 11)
-                        self.pdf.multi_cell(0, 5, str(edu['description']))
-                else:
-                    font = 'DejaVu' if self.font_available else 'Helvetica'
-                    self.pdf.set_font(font, '', 11)
-                    self.pdf.multi_cell(0, 5, str(edu))
+        for edu in education:
+            if edu.degree or edu.institution:
+                self.pdf.set_font(bold, '', 12)
+                self.pdf.cell(0, 6, f"{edu.degree}, {edu.institution}", ln=True)
                 
-                self.pdf.ln(5)
-        else:
-            font = 'DejaVu' if self.font_available else 'Helvetica'
-            self.pdf.set_font(font, '', 11)
-            self.pdf.multi_cell(0, 5, str(education))
+                self.pdf.set_font(regular, '', 10)
+                date_range = f"{edu.start_date} - {edu.end_date}"
+                date_loc = f"{date_range} | {edu.location}" if edu.location else date_range
+                self.pdf.cell(0, 5, date_loc, ln=True)
+                
+            if edu.description:
+                self.pdf.ln(2)
+                self.pdf.set_font(regular, '', 11)
+                self.pdf.multi_cell(0, 5, edu.description)
+            
+            self.pdf.ln(5)
             
         self.pdf.ln(5)
         
@@ -202,45 +170,33 @@ class ResumePDF:
         font = 'DejaVu' if self.font_available else 'Helvetica'
         self.pdf.set_font(font, '', 11)
         
-        if isinstance(certifications, list):
-            for cert in certifications:
-                self.pdf.cell(5, 5, chr(8226), ln=0)
-                self.pdf.multi_cell(0, 5, f" {str(cert)}")
-        else:
-            self.pdf.multi_cell(0, 5, str(certifications))
+        for cert in certifications:
+            self.pdf.cell(5, 5, chr(8226), ln=0)
+            self.pdf.multi_cell(0, 5, f" {cert}")
             
         self.pdf.ln(5)
     
     def generate_from_json(self, json_data):
-        """Generate a PDF resume from JSON data"""
-        if isinstance(json_data, str):
-            data = json.loads(json_data)
-        else:
-            data = json_data
+        """Generate a PDF resume from resume data (a Resume, dict or JSON text)"""
+        resume = json_data if isinstance(json_data, Resume) else parse_resume(json_data)
             
-        if not isinstance(data, dict):
-            raise ValueError("resume_data must be a dictionary")
-            
-        self.add_header(data.get('name', 'Unknown Name'), data.get('title', ''))
+        self.add_header(resume.name or 'Unknown Name', resume.title)
         
-        if 'contact' in data and isinstance(data['contact'], dict):
-            self.add_contact_info(data['contact'])
-            
-        if 'summary' in data:
-            self.add_summary(data['summary'])
+        if resume.contact:
+            self.add_contact_info(resume.contact)
             
-        if 'skills' in data:
-            self.add_skills(data['skills'])
+        if resume.summary:
+            self.add_summary(resume.summary)
             
-        if 'experience' in data:
-            self.add_experience(data['experience'])
-            
-        if 'education' in data:
-            self.add_education(data['education'])
-            
-        if 'certifications' in data:
-            self.add_certifications(data['certifications'])
+        self.add_skills(resume.skills)
+        self.add_experience(resume.experience)
+        self.add_education(resume.education)
+        self.add_certifications(resume.certifications)
             
+    def to_bytes(self):
+        """Return the PDF as bytes without touching the disk"""
+        return bytes(self.pdf.output())
+        
     def save(self, filename='resume.pdf'):
         """Save the PDF to a file"""
         try:
@@ -286,16 +242,22 @@ def generate_resume_pdf(json_data, output_file='resume.pdf'):
         return generate_resume_pdf_simple(json_data, output_file)
 
 def generate_resume_pdf_simple(json_data, output_file='resume.pdf'):
-    """Generate a simple resume PDF from JSON data"""
+    """Generate a simple resume PDF from resume data (a Resume, dict or JSON text)"""
+    pdf_bytes = render_resume_pdf_simple(json_data)
+    if pdf_bytes is None:
+        return None
     try:
-        # Parse JSON if it's a string
-        if isinstance(json_data, str):
-            data = json.loads(json_data)
-        else:
-            data = json_data
-            
-        if not isinstance(data, dict):
-            raise ValueError("resume_data must be a dictionary")
+        with open(output_file, 'wb') as f:
+            f.write(pdf_bytes)
+        return output_file
+    except OSError as e:
+        print(f"Error saving simple PDF: {str(e)}")
+        return None
+
+def render_resume_pdf_simple(json_data):
+    """Render a simple resume PDF in memory; returns the PDF bytes or None"""
+    try:
+        resume = json_data if isinstance(json_data, Resume) else parse_resume(json_data)
             
         # Create a simple PDF
         pdf = FPDF()
@@ -303,128 +265,87 @@ def generate_resume_pdf_simple(json_data, output_file='resume.pdf'):
         
         # Add name and title
         pdf.set_font('Helvetica', 'B', 16)
-        name = data.get('name', 'Unknown Name')
-        pdf.cell(0, 10, name, ln=True, align='C')
+        pdf.cell(0, 10, resume.name or 'Unknown Name', ln=True, align='C')
         
-        if 'title' in data:
+        if resume.title:
             pdf.set_font('Helvetica', '', 12)
-            pdf.cell(0, 10, str(data['title']), ln=True, align='C')
+            pdf.cell(0, 10, resume.title, ln=True, align='C')
         
         # Add contact info
-        if 'contact' in data and isinstance(data['contact'], dict):
+        if resume.contact:
             pdf.ln(5)
             pdf.set_font('Helvetica', '', 10)
-            contact = data['contact']
-            
             contact_text = ""
-            if 'email' in contact:
-                contact_text += f"Email: {contact['email']}   "
-            if 'phone' in contact:
-                contact_text += f"Phone: {contact['phone']}   "
-                
+            if resume.contact.email:
+                contact_text += f"Email: {resume.contact.email}   "
+            if resume.contact.phone:
+                contact_text += f"Phone: {resume.contact.phone}   "
             pdf.cell(0, 5, contact_text, ln=True, align='C')
         
         # Add summary
-        if 'summary' in data:
+        if resume.summary:
             pdf.ln(5)
             pdf.set_font('Helvetica', 'B', 12)
             pdf.cell(0, 10, 'Summary', ln=True)
             pdf.set_font('Helvetica', '', 10)
-            pdf.multi_cell(0, 5, str(data['summary']))
+            pdf.multi_cell(0, 5, resume.summary)
         
         # Add skills
-        if 'skills' in data:
+        if resume.skills:
             pdf.ln(5)
             pdf.set_font('Helvetica', 'B', 12)
             pdf.cell(0, 10, 'Skills', ln=True)
             pdf.set_font('Helvetica', '', 10)
-            
-            if isinstance(data['skills'], list):
-                skills_text = ", ".join(str(skill) for skill in data['skills'])
-            else:
-                skills_text = str(data['skills'])
-                
-            pdf.multi_cell(0, 5, skills_text)
+            pdf.multi_cell(0, 5, ", ".join(resume.skills))
         
         # Add experience
-        if 'experience' in data:
+        if resume.experience:
             pdf.ln(5)
             pdf.set_font('Helvetica', 'B', 12)
             pdf.cell(0, 10, 'Experience', ln=True)
-            pdf.set_font('Helvetica', '', 10)
             
-            if isinstance(data['experience'], list):
-                for exp in data['experience']:
-                    if isinstance(exp, dict):
-                        position = exp.get('position', '')
-                        company = exp.get('company', '')
-                        pdf.set_font('Helvetica', 'B', 10)
-                        pdf.cell(0, 5, f"{position} at {company}", ln=True)
-                        pdf.set_font('Helvetica', '', 10)
-                        
-                        date_range = f"{exp.get('start_date', '')} - {exp.get('end_date', 'Present')}"
-                        pdf.cell(0, 5, date_range, ln=True)
-                        
-                        if 'description' in exp:
-                            pdf.multi_cell(0, 5, str(exp['description']))
-                        
-                        pdf.ln(3)
-                    else:
-                        pdf.multi_cell(0, 5, str(exp))
-                        pdf.ln(3)
-            else:
-                pdf.multi_cell(0, 5, str(data['experience']))
+            for exp in resume.experience:
+                if exp.position or exp.company:
+                    pdf.set_font('Helvetica', 'B', 10)
+                    pdf.cell(0, 5, f"{exp.position} at {exp.company}", ln=True)
+                    pdf.set_font('Helvetica', '', 10)
+                    pdf.cell(0, 5, f"{exp.start_date} - {exp.end_date or 'Present'}", ln=True)
+                pdf.set_font('Helvetica', '', 10)
+                if exp.description:
+                    pdf.multi_cell(0, 5, exp.description)
+                pdf.ln(3)
         
         # Add education
-        if 'education' in data:
+        if resume.education:
             pdf.ln(5)
             pdf.set_font('Helvetica', 'B', 12)
             pdf.cell(0, 10, 'Education', ln=True)
-            pdf.set_font('Helvetica', '', 10)
             
-            if isinstance(data['education'], list):
-                for edu in data['education']:
-                    if isinstance(edu, dict):
-                        degree = edu.get('degree', '')
-                        institution = edu.get('institution', '')
-                        pdf.set_font('Helvetica', 'B', 10)
-                        pdf.cell(0, 5, f"{degree}, {institution}", ln=True)
-                        pdf.set_font('Helvetica', '', 10)
-                        
-                        date_range = f"{edu.get('start_date', '')} - {edu.get('end_date', '')}"
-                        pdf.cell(0, 5, date_range, ln=True)
-                        
-                        if 'description' in edu:
-                            pdf.multi_cell(0, 5, str(edu['description']))
-                        
-                        pdf.ln(3)
-                    else:
-                        pdf.multi_cell(0, 5, str(edu))
-                        pdf.ln(3)
-            else:
-                pdf.multi_cell(0, 5, str(data['education']))
+            for edu in resume.education:
+                if edu.degree or edu.institution:
+                    pdf.set_font('Helvetica', 'B', 10)
+                    pdf.cell(0, 5, f"{edu.degree}, {edu.institution}", ln=True)
+                    pdf.set_font('Helvetica', '', 10)
+                    pdf.cell(0, 5, f"{edu.start_date} - {edu.end_date}", ln=True)
+                pdf.set_font('Helvetica', '', 10)
+                if edu.description:
+                    pdf.multi_cell(0, 5, edu.description)
+                pdf.ln(3)
         
         # Add certifications
-        if 'certifications' in data:
+        if resume.certifications:
             pdf.ln(5)
             pdf.set_font('Helvetica', 'B', 12)
             pdf.cell(0, 10, 'Certifications', ln=True)
             pdf.set_font('Helvetica', '', 10)
             
-            if isinstance(data['certifications'], list):
-                for cert in data['certifications']:
-                    pdf.cell(5, 5, chr(127), ln=0)
-                    pdf.multi_cell(0, 5, f" {str(cert)}")
-            else:
-                pdf.multi_cell(0, 5, str(data['certifications']))
-        
-        # Save the PDF
-        pdf.output(output_file)
-        if os.path.exists(output_file):
-            return output_file
-        return None
+            for cert in resume.certifications:
+                pdf.cell(5, 5, chr(127), ln=0)
+                pdf.multi_cell(0, 5, f" {cert}")
+        
+        return bytes(pdf.output())
         
     except Exception as e:
         print(f"Error generating simple PDF: {str(e)}")
         print(traceback.format_exc())
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,161 @@
+import glob
+import logging
+import os
+import re
+import threading
+import time
+
+from jinja2 import Environment, StrictUndefined
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Name of the chat system prompt and the version served when none is requested
+DEFAULT_PROMPT = "resume"
+DEFAULT_VERSION = os.getenv("PROMPT_VERSION", "v1")
+# System prompt of the background resume extraction call
+EXTRACT_PROMPT = "extract"
+EXTRACT_PROMPT_VERSION = os.getenv("EXTRACT_PROMPT_VERSION", "v1")
+# System prompt of the call that repairs extraction output failing validation
+REPAIR_PROMPT = "repair"
+REPAIR_PROMPT_VERSION = os.getenv("REPAIR_PROMPT_VERSION", "v1")
+
+# Minimum seconds between mtime checks of a template file
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "1.0"))
+
+# Used when a template file cannot be read
+FALLBACK_SYSTEM_PROMPT = (
+    "You are an AI assistant that helps users create a professional resume. "
+    "Engage in a conversation to collect resume details (name, title, contact information, summary, skills, experience, education, certifications). "
+    "Store the information incrementally. "
+    "Whenever you learn new or corrected details, include a JSON code block containing only the fields that are new or changed since your last JSON block (a JSON merge patch); use null to remove a field and send lists in full when they change. "
+    "The complete resume uses this format:\n"
+    "```json\n"
+    "{\n"
+    '    "name": "John Doe",\n'
+    '    "title": "Software Engineer",\n'
+    '    "contact": {\n'
+    '        "email": "john.doe@example.com",\n'
+    '        "phone": "+1-555-555-5555"\n'
+    "    },\n"
+    '    "summary": "Experienced software engineer with a background in developing scalable web applications and working across the full stack.",\n'
+    '    "skills": ["Python", "JavaScript", "AWS", "Docker"],\n'
+    '    "experience": [\n'
+    "        {\n"
+    '            "position": "Developer",\n'
+    '            "company": "Tech Corp",\n'
+    '            "start_date": "2020-01",\n'
+    '            "end_date": "Present",\n'
+    '            "description": "Led development of cloud-based solutions using AWS and Python."\n'
+    "        }\n"
+    "    ],\n"
+    '    "education": [\n'
+    "        {\n"
+    '            "degree": "B.S. in Computer Science",\n'
+    '            "institution": "State University",\n'
+    '            "start_date": "2014-09",\n'
+    '            "end_date": "2018-05"\n'
+    "        }\n"
+    "    ],\n"
+    '    "certifications": [\n'
+    '        "AWS Certified Developer – Associate"\n'
+    "    ]\n"
+    "}\n"
+    "```"
+)
+
+
+class PromptTemplate:
+    """A prompt template file kept in memory and reloaded when its mtime changes"""
+
+    def __init__(self, name, version, path, environment):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.environment = environment
+        self.mtime = None
+        self.source = None
+        self.template = None
+        self.rendered = None  # Cached rendering without variables
+        self.last_checked = 0.0
+
+    def refresh(self, reload_interval):
+        """Reload the file if it changed since it was last read"""
+        now = time.monotonic()
+        if self.template is not None and now - self.last_checked < reload_interval:
+            return
+        self.last_checked = now
+
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as file:
+            source = file.read()
+        self.template = self.environment.from_string(source)
+        self.source = source
+        self.rendered = None
+        self.mtime = mtime
+        logging.debug(f"Loaded prompt template {self.name}:{self.version} from {self.path}")
+
+    def render(self, variables):
+        if not variables:
+            if self.rendered is None:
+                self.rendered = self.template.render()
+            return self.rendered
+        return self.template.render(**variables)
+
+
+class PromptRegistry:
+    """In-memory prompt templates keyed by name and version"""
+
+    def __init__(self, reload_interval=PROMPT_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self.environment = Environment(undefined=StrictUndefined, keep_trailing_newline=True)
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, version=DEFAULT_VERSION):
+        """Register a template file under name and version"""
+        if not os.path.isabs(path):
+            path = os.path.join(BASE_DIR, path)
+        with self._lock:
+            self._templates[(name, version)] = PromptTemplate(name, version, path, self.environment)
+
+    def versions(self, name):
+        """Return the registered versions of a template"""
+        with self._lock:
+            return sorted(version for (template_name, version) in self._templates if template_name == name)
+
+    def get(self, name=DEFAULT_PROMPT, version=None, **variables):
+        """Render a template, reloading it first if the file changed"""
+        version = version or DEFAULT_VERSION
+        with self._lock:
+            template = self._templates.get((name, version))
+            if template is None:
+                raise KeyError(f"Unknown prompt template {name}:{version}")
+            template.refresh(self.reload_interval)
+            return template.render(variables)
+
+
+def parse_variant(variant):
+    """Split a "name:version" variant into its parts (either may be empty)"""
+    if not variant:
+        return DEFAULT_PROMPT, None
+    name, _, version = variant.partition(":")
+    return name or DEFAULT_PROMPT, version or None
+
+
+def register_default_prompts(registry):
+    """Register prompt_template.txt, any prompt_template_<version>.txt variants
+    and the extraction and repair prompts"""
+    registry.register(DEFAULT_PROMPT, "prompt_template.txt", version="v1")
+    registry.register(EXTRACT_PROMPT, "extract_prompt_template.txt", version="v1")
+    registry.register(REPAIR_PROMPT, "repair_prompt_template.txt", version="v1")
+    for path in glob.glob(os.path.join(BASE_DIR, "prompt_template_*.txt")):
+        match = re.fullmatch(r"prompt_template_(\w+)\.txt", os.path.basename(path))
+        if match:
+            registry.register(DEFAULT_PROMPT, path, version=match.group(1))
+
+
+prompt_registry = PromptRegistry()
+register_default_prompts(prompt_registry)
@@ -0,0 +1,192 @@
+import functools
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import pdf_render_job_states
+from render_pool import RenderQueueFull, PDF_RENDER_TIMEOUT, PDF_RENDER_WORKERS
+
+# Render job settings (overridable from the environment)
+# Seconds a finished job is kept for status requests
+PDF_JOB_TTL = float(os.getenv("PDF_JOB_TTL", "3600"))
+# Seconds between sweeps that drop expired jobs
+PDF_JOB_SWEEP_INTERVAL = float(os.getenv("PDF_JOB_SWEEP_INTERVAL", "60"))
+# Jobs queued or running at once; more are rejected with RenderQueueFull
+PDF_JOB_MAX_PENDING = int(os.getenv("PDF_JOB_MAX_PENDING", "100"))
+# Jobs submitted to the render pool at once; the rest wait as "queued"
+PDF_JOB_CONCURRENCY = int(os.getenv("PDF_JOB_CONCURRENCY", str(max(1, PDF_RENDER_WORKERS))))
+# Seconds a job waits for a place in a full render pool before it fails with
+# "render queue busy" (0 waits indefinitely); a few render timeouts by default
+PDF_JOB_QUEUE_TIMEOUT = float(os.getenv("PDF_JOB_QUEUE_TIMEOUT", str((PDF_RENDER_TIMEOUT or 20) * 6)))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class RenderJob:
+    """State of one asynchronous resume render"""
+
+    def __init__(self, key, lock):
+        self._lock = lock  # Guards the fields below; shared by all jobs
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.state = QUEUED
+        self.path = None
+        self.error = None
+        self.version = 0  # Bumped on every state change
+        self.updated_at = time.time()
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def to_dict(self):
+        with self._lock:
+            data = {"job_id": self.job_id, "state": self.state}
+            if self.state == DONE:
+                data["download_url"] = f"/download-resume/{os.path.basename(self.path)}"
+            if self.state == FAILED:
+                data["error"] = self.error
+            return data
+
+
+class RenderJobs:
+    """Runs resume renders in the background and tracks their state.
+
+    Submitting a resume whose job is still queued, running or done returns
+    that job, so retries do not render again. Finished jobs are dropped
+    after the TTL; their PDFs belong to the PDF cache, which other requests
+    share, and are left in place. Job state lives in this process, so with
+    several workers the status requests must reach the one that accepted
+    the job.
+    """
+
+    def __init__(self, ttl=PDF_JOB_TTL, max_pending=PDF_JOB_MAX_PENDING, concurrency=PDF_JOB_CONCURRENCY,
+                 sweep_interval=PDF_JOB_SWEEP_INTERVAL, queue_timeout=PDF_JOB_QUEUE_TIMEOUT):
+        self.ttl = ttl
+        self.queue_timeout = queue_timeout
+        self.max_pending = max_pending
+        self.concurrency = concurrency
+        self.sweep_interval = sweep_interval
+        self.expired = 0
+        self._jobs = OrderedDict()  # job_id -> RenderJob; finished jobs move to the end
+        self._by_key = {}  # content key -> job_id
+        self._changed = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="render-job")
+        self._sweeper = None
+
+    def submit(self, key, render_to_path):
+        """Start a job for key, or return the live job for it.
+
+        render_to_path(started) renders the PDF and returns its path, or None
+        on failure; it calls started() when the render gets a place in the
+        render pool. Raises RenderQueueFull when too many jobs are pending.
+        """
+        with self._changed:
+            self._start_sweeper()
+            self._evict(time.time())
+            job = self._jobs.get(self._by_key.get(key))
+            if job is not None and job.state != FAILED:
+                return job
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise RenderQueueFull(float(pending) / self.concurrency)
+            job = RenderJob(key, self._changed)
+            self._jobs[job.job_id] = job
+            self._by_key[key] = job.job_id
+        pdf_render_job_states.inc(state=QUEUED)
+        self._executor.submit(self._run, job, render_to_path)
+        return job
+
+    def get(self, job_id):
+        """Return the job, or None if it is unknown or expired"""
+        with self._changed:
+            self._evict(time.time())
+            return self._jobs.get(job_id)
+
+    def wait(self, job, version, timeout):
+        """Wait until job changes from version; returns the current version"""
+        with self._changed:
+            self._changed.wait_for(lambda: job.version != version, timeout)
+            return job.version
+
+    def stats(self):
+        with self._changed:
+            states = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {"jobs": len(self._jobs), "states": states, "expired": self.expired}
+
+    def _run(self, job, render_to_path):
+        # Cache hits finish without a render, going from queued to done
+        started = functools.partial(self._set_state, job, RUNNING)
+        deadline = time.monotonic() + self.queue_timeout if self.queue_timeout > 0 else None
+        while True:
+            try:
+                path = render_to_path(started)
+            except RenderQueueFull as e:
+                # The pool is busy with other renders; stay queued until the deadline
+                remaining = deadline - time.monotonic() if deadline is not None else e.retry_after
+                if remaining <= 0:
+                    logging.warning(f"Render job {job.job_id} gave up after waiting {self.queue_timeout:.0f}s for the render queue")
+                    self._set_state(job, FAILED, error="render queue busy")
+                    return
+                time.sleep(min(e.retry_after, remaining))
+                continue
+            except Exception as e:
+                logging.error(f"Render job {job.job_id} failed: {traceback.format_exc()}")
+                self._set_state(job, FAILED, error=str(e))
+                return
+            break
+        if path is None:
+            self._set_state(job, FAILED, error="Failed to generate resume")
+        else:
+            self._set_state(job, DONE, path=path)
+
+    def _set_state(self, job, state, path=None, error=None):
+        with self._changed:
+            job.state = state
+            job.path = path
+            job.error = error
+            job.version += 1
+            job.updated_at = time.time()
+            if job.finished:
+                self._jobs.move_to_end(job.job_id)
+            self._changed.notify_all()
+        pdf_render_job_states.inc(state=state)
+        logging.debug(f"Render job {job.job_id} is {state}")
+
+    def _start_sweeper(self):
+        # Called with the lock held; the thread starts with the first job
+        if self._sweeper is None and self.sweep_interval > 0:
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="render-job-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            with self._changed:
+                self._evict(time.time())
+
+    def _evict(self, now):
+        # Called with the lock held. Finished jobs are kept in the order they
+        # finished, so stop at the first one that has not expired.
+        for job_id, job in list(self._jobs.items()):
+            if not job.finished:
+                continue
+            if now - job.updated_at <= self.ttl:
+                break
+            del self._jobs[job_id]
+            if self._by_key.get(job.key) == job_id:
+                del self._by_key[job.key]
+            self.expired += 1
+
+
+render_jobs = RenderJobs()
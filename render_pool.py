@@ -0,0 +1,242 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from font_registry import font_registry
+from metrics import pdf_render_jobs, pdf_render_queue_depth, pdf_render_rejected
+from pdf_generator import ResumePDF, render_resume_pdf_simple
+
+try:
+    import resource
+except ImportError:
+    # Windows: workers run without a memory cap
+    resource = None
+
+# Render worker settings (overridable from the environment). 0 workers
+# renders in the request thread, as before the pool existed.
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 1)))
+# Jobs queued or running at once; more are rejected with RenderQueueFull
+PDF_RENDER_QUEUE_SIZE = int(os.getenv("PDF_RENDER_QUEUE_SIZE", str(max(1, PDF_RENDER_WORKERS) * 4)))
+# Per-job limits: wall-clock seconds and worker address space in MB (0 disables)
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "20"))
+PDF_RENDER_MEMORY_MB = int(os.getenv("PDF_RENDER_MEMORY_MB", "512"))
+
+# Workers stop a job at its time limit with SIGALRM where the platform has
+# it (not on Windows); elsewhere the caller stops waiting at a deadline
+_HAS_ALARM = hasattr(signal, "SIGALRM") and hasattr(signal, "setitimer")
+
+
+class RenderQueueFull(Exception):
+    """Too many renders are queued; retry_after is a hint in seconds"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"PDF render queue is full, retry in {retry_after:.0f}s")
+
+
+class RenderTimeout(BaseException):
+    """A render ran past its time limit.
+
+    A BaseException so the renderers' own error handling, which turns
+    exceptions into a None result, does not swallow it.
+    """
+
+
+def _init_worker(memory_mb):
+    # Runs once in each worker: cap its memory and parse the fonts before
+    # the first job
+    if memory_mb and resource is not None:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    font_registry.preload()
+    if _HAS_ALARM:
+        signal.signal(signal.SIGALRM, _alarm)
+
+
+def _alarm(signum, frame):
+    raise RenderTimeout()
+
+
+def render_resume(renderer, resume_data):
+    """Render resume data with the named renderer ("simple" or "styled"); returns bytes or None"""
+    if renderer == "styled":
+        resume = ResumePDF()
+        resume.generate_from_json(resume_data)
+        return resume.to_bytes()
+    return render_resume_pdf_simple(resume_data)
+
+
+def _run_job(renderer, resume_data, timeout):
+    if not _HAS_ALARM:
+        return render_resume(renderer, resume_data)
+    # Jobs run in the worker's main thread, so SIGALRM interrupts them
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return render_resume(renderer, resume_data)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _worker_context():
+    # forkserver workers do not inherit the app's threads and locks, and the
+    # renderers are imported once in the fork server rather than per worker.
+    # Like spawn workers, each worker still imports the main module again
+    # (as __mp_main__), so it must not start services at import.
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["render_pool"])
+    return context
+
+
+class RenderPool:
+    """Renders resume PDFs in a pool of worker processes.
+
+    Layout and font subsetting are CPU-bound; running them in processes
+    keeps them from holding the GIL that the chat endpoints need. The number
+    of jobs queued or running is bounded, and each job has a time limit and
+    runs in a worker with capped memory.
+    """
+
+    def __init__(self, workers=PDF_RENDER_WORKERS, queue_size=PDF_RENDER_QUEUE_SIZE,
+                 timeout=PDF_RENDER_TIMEOUT, memory_mb=PDF_RENDER_MEMORY_MB):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_started = False
+        self.in_flight = 0
+        self.rejected = 0
+        # Moving average of job duration, for Retry-After hints
+        self.average_seconds = 1.0
+
+    def start(self):
+        """Start the worker processes now rather than on the first render"""
+        # Workers import the app's main module again; they must not start
+        # pools of their own
+        if self.workers <= 0 or multiprocessing.current_process().name != "MainProcess":
+            return 0
+        executor = self._get_executor()
+        for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        return self.workers
+
+    def render(self, renderer, resume_data, on_start=None):
+        """Render in a worker and return the PDF bytes, or None if the render failed.
+
+        Raises RenderQueueFull when the queue is at its limit. on_start, if
+        given, is called once the job has its place in the queue.
+        """
+        if self.workers <= 0:
+            if on_start is not None:
+                on_start()
+            return render_resume(renderer, resume_data)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+                retry_after = max(1.0, self.average_seconds * self.in_flight / self.workers)
+            pdf_render_rejected.inc()
+            raise RenderQueueFull(retry_after)
+        depth = self._set_in_flight(1)
+        started = time.perf_counter()
+        try:
+            if on_start is not None:
+                on_start()
+            return self._render(renderer, resume_data, depth)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.average_seconds = 0.8 * self.average_seconds + 0.2 * elapsed
+            self._set_in_flight(-1)
+            self._slots.release()
+
+    def _render(self, renderer, resume_data, depth):
+        executor = self._get_executor()
+        if _HAS_ALARM:
+            # The worker enforces the time limit; this only guards against a
+            # worker that stopped responding
+            deadline = self.timeout * self.queue_size + 5
+        else:
+            # Each job queued ahead of this one may run up to the limit too
+            deadline = self.timeout * ((depth - 1) // self.workers + 1)
+        try:
+            future = executor.submit(_run_job, renderer, resume_data, self.timeout)
+            result = future.result(timeout=deadline)
+        except RenderTimeout:
+            logging.error(f"PDF render timed out after {self.timeout}s")
+            pdf_render_jobs.inc(result="timeout")
+            return None
+        except TimeoutError:
+            # The worker is still busy; new jobs go to a fresh pool
+            logging.error(f"PDF render did not finish within {deadline:g}s; restarting the pool")
+            pdf_render_jobs.inc(result="timeout")
+            self._reset_executor(executor)
+            return None
+        except BrokenProcessPool:
+            # A worker died, for example past its memory limit; start a new pool
+            logging.error("PDF render worker died; restarting the pool")
+            pdf_render_jobs.inc(result="crashed")
+            self._reset_executor(executor)
+            return None
+        except Exception as e:
+            logging.error(f"PDF render failed: {str(e)}")
+            pdf_render_jobs.inc(result="failed")
+            return None
+        pdf_render_jobs.inc(result="ok" if result is not None else "failed")
+        return result
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if not self._executor_started:
+                    atexit.register(self.shutdown)
+                    self._executor_started = True
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=_worker_context(),
+                    initializer=_init_worker,
+                    initargs=(self.memory_mb,),
+                )
+            return self._executor
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _set_in_flight(self, delta):
+        with self._lock:
+            self.in_flight += delta
+            depth = self.in_flight
+        pdf_render_queue_depth.set(depth)
+        return depth
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "queue_size": self.queue_size,
+                "rejected": self.rejected,
+                "average_seconds": round(self.average_seconds, 3),
+            }
+
+
+render_pool = RenderPool()
@@ -0,0 +1,249 @@
+import copy
+import json
+import re
+from typing import Annotated, List, Optional
+
+from pydantic import AfterValidator, BeforeValidator, ConfigDict, Field, TypeAdapter, ValidationError
+from pydantic.dataclasses import dataclass
+
+from json_extractor import extract_json
+from resume_state import merge_patch
+
+_MONTHS = {name: index for index, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], 1)}
+_PRESENT = {"present", "current", "currently", "now", "ongoing", "today", "till date", "to date"}
+
+_YEAR_MONTH = re.compile(r"(\d{4})[-/.](\d{1,2})(?:[-/.]\d{1,2})?")
+_MONTH_YEAR = re.compile(r"(\d{1,2})[-/.](\d{4})")
+_NAMED_MONTH = re.compile(r"([A-Za-z]{3,9})\.?,?\s+(\d{4})")
+_LIST_SEPARATOR = re.compile(r"\s*(?:[,;\n]|\s•\s)\s*")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value if item is not None)
+    return value
+
+
+def normalize_date(value):
+    """Normalize "2020-1", "01/2020" or "Jan 2020" to "2020-01" and "current" to "Present"
+
+    Values in any other format are kept as they are.
+    """
+    if not value:
+        return value
+    if value.lower() in _PRESENT:
+        return "Present"
+    match = _YEAR_MONTH.fullmatch(value)
+    if match and 1 <= int(match.group(2)) <= 12:
+        return f"{match.group(1)}-{int(match.group(2)):02d}"
+    match = _MONTH_YEAR.fullmatch(value)
+    if match and 1 <= int(match.group(1)) <= 12:
+        return f"{match.group(2)}-{int(match.group(1)):02d}"
+    match = _NAMED_MONTH.fullmatch(value)
+    if match and match.group(1)[:3].lower() in _MONTHS:
+        return f"{match.group(2)}-{_MONTHS[match.group(1)[:3].lower()]:02d}"
+    return value
+
+
+def _string_list(value):
+    # Accept "Python, SQL", a single item or a list; drop empty items
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = _LIST_SEPARATOR.split(value)
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    items = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get("name")
+        item = _text(item)
+        if isinstance(item, str) and item.strip():
+            items.append(item.strip())
+    return items
+
+
+def _dedupe(items):
+    seen = set()
+    unique = []
+    for item in items:
+        if item.lower() not in seen:
+            seen.add(item.lower())
+            unique.append(item)
+    return unique
+
+
+def _entries(value):
+    # A single entry or free-text entries become a list of entry objects
+    if value is None:
+        return []
+    if isinstance(value, (dict, str)):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        return value
+    return [{"description": item} if isinstance(item, str) else item for item in value]
+
+
+def _contact(value):
+    if isinstance(value, str):
+        email = _EMAIL.search(value)
+        rest = _EMAIL.sub("", value).strip(" ,;|")
+        return {"email": email.group(0) if email else "", "phone": rest}
+    return value
+
+
+def _email(value):
+    return value.lower()
+
+
+def _phone(value):
+    return " ".join(value.split())
+
+
+Text = Annotated[str, BeforeValidator(_text)]
+Date = Annotated[str, BeforeValidator(_text), AfterValidator(normalize_date)]
+StringList = Annotated[List[str], BeforeValidator(_string_list)]
+
+_CONFIG = ConfigDict(str_strip_whitespace=True, extra="ignore")
+
+
+@dataclass(slots=True, config=_CONFIG)
+class Contact:
+    email: Annotated[str, BeforeValidator(_text), AfterValidator(_email)] = ""
+    phone: Annotated[str, BeforeValidator(_text), AfterValidator(_phone)] = ""
+    linkedin: Text = ""
+    website: Text = ""
+
+
+@dataclass(slots=True, config=_CONFIG)
+class Experience:
+    position: Text = ""
+    company: Text = ""
+    start_date: Date = ""
+    end_date: Date = ""
+    location: Text = ""
+    description: Text = ""
+    achievements: StringList = Field(default_factory=list)
+
+
+@dataclass(slots=True, config=_CONFIG)
+class Education:
+    degree: Text = ""
+    institution: Text = ""
+    start_date: Date = ""
+    end_date: Date = ""
+    location: Text = ""
+    description: Text = ""
+
+
+@dataclass(slots=True, config=_CONFIG)
+class Resume:
+    """The resume the chat collects and the renderers draw, validated once"""
+
+    name: Text = ""
+    title: Text = ""
+    summary: Text = ""
+    skills: Annotated[StringList, AfterValidator(_dedupe)] = Field(default_factory=list)
+    experience: Annotated[List[Experience], BeforeValidator(_entries)] = Field(default_factory=list)
+    education: Annotated[List[Education], BeforeValidator(_entries)] = Field(default_factory=list)
+    certifications: StringList = Field(default_factory=list)
+    contact: Annotated[Optional[Contact], BeforeValidator(_contact)] = None
+
+
+# Compiled once; validation runs in pydantic-core
+_resume_adapter = TypeAdapter(Resume)
+
+
+def parse_resume(data):
+    """Validate and normalize resume data (a dict or JSON text) into a Resume.
+
+    Raises ValidationError for payloads that are not a resume object.
+    """
+    if isinstance(data, (str, bytes)):
+        return _resume_adapter.validate_json(data)
+    return _resume_adapter.validate_python(data)
+
+
+def normalize_resume(data):
+    """Return resume data as a plain dict after validation and normalization"""
+    return _resume_adapter.dump_python(parse_resume(data), exclude_defaults=True)
+
+
+def _inline_refs(schema, definitions=None):
+    # Resolve "#/$defs/..." references and forbid unknown fields, so the
+    # schema is self-contained for the LLM
+    if definitions is None:
+        definitions = schema.get("$defs", {})
+    if isinstance(schema, list):
+        return [_inline_refs(item, definitions) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        return _inline_refs(definitions[schema["$ref"].rsplit("/", 1)[-1]], definitions)
+    result = {key: _inline_refs(value, definitions) for key, value in schema.items()
+              if key not in ("$defs", "properties", "title", "default", "description")}
+    if "properties" in schema:
+        result["properties"] = {name: _inline_refs(field, definitions)
+                                for name, field in schema["properties"].items()}
+    if result.get("type") == "object":
+        result["additionalProperties"] = False
+        result.pop("required", None)
+    return result
+
+
+# JSON Schema of the resume, derived from the Resume model
+RESUME_SCHEMA = _inline_refs(_resume_adapter.json_schema())
+
+
+def patch_schema(schema):
+    """Schema of a JSON merge patch for schema: object fields become optional and nullable"""
+    schema = copy.deepcopy(schema)
+    if "anyOf" in schema:
+        # Already nullable, like contact; make the object branch a patch too
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        if len(options) == 1:
+            schema = options[0]
+    if schema.get("type") == "object":
+        schema["properties"] = {
+            name: {"anyOf": [patch_schema(field), {"type": "null"}]}
+            for name, field in schema.get("properties", {}).items()
+        }
+    return schema
+
+
+RESUME_PATCH_SCHEMA = patch_schema(RESUME_SCHEMA)
+
+
+def validation_errors(error):
+    """Readable messages for a ValidationError, like "experience.0.company: Input should be..." """
+    return [f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+            for item in error.errors()]
+
+
+def parse_resume_patch(text, resume=None):
+    """Parse a model reply into a resume merge patch.
+
+    Returns (patch, errors). JSON-mode replies are parsed directly; other
+    replies fall back to extracting the best embedded JSON object. The
+    patch is valid when the Resume model accepts it merged into resume,
+    with the same coercions as parse_resume.
+    """
+    try:
+        patch = json.loads(text)
+    except (TypeError, ValueError):
+        patch = extract_json(text or "")
+        if patch is None:
+            return None, ["reply is not valid JSON"]
+    if not isinstance(patch, dict):
+        return None, ["reply must be a JSON object"]
+    try:
+        parse_resume(merge_patch(resume or {}, patch))
+    except ValidationError as e:
+        return None, validation_errors(e)
+    return patch, []
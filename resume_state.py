@@ -0,0 +1,31 @@
+import copy
+
+
+def merge_patch(target, patch):
+    """Apply an RFC 7396 JSON merge patch to target and return the result.
+
+    Objects are merged recursively, null removes a field and any other value
+    (including lists) replaces the existing one. target is not modified.
+    """
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def changed_paths(patch, prefix=""):
+    """Return the dotted field paths a merge patch touches"""
+    paths = []
+    for key, value in patch.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            paths.extend(changed_paths(value, path + "."))
+        else:
+            paths.append(path)
+    return paths
@@ -0,0 +1,340 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+# Durable session storage (overridable from the environment). Persistence is
+# off unless SESSION_DB names a SQLite file; several worker processes can
+# share the file as long as each session is served by one worker at a time.
+SESSION_DB = os.getenv("SESSION_DB")
+# Writes are queued and committed together at most this many seconds later
+SESSION_DB_COMMIT_INTERVAL = float(os.getenv("SESSION_DB_COMMIT_INTERVAL", "0.05"))
+SESSION_DB_BATCH_SIZE = int(os.getenv("SESSION_DB_BATCH_SIZE", "500"))
+# Seconds between compaction passes; 0 disables background compaction
+SESSION_DB_COMPACT_INTERVAL = float(os.getenv("SESSION_DB_COMPACT_INTERVAL", "300"))
+# Sessions untouched for this many seconds are deleted by compaction
+SESSION_DB_RETENTION = float(os.getenv("SESSION_DB_RETENTION", str(7 * 24 * 3600)))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "session_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)",
+    # Append-only log: op is "message", "truncate" (to length) or "reset"
+    "CREATE TABLE IF NOT EXISTS messages ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, op TEXT NOT NULL, "
+    "role TEXT, content TEXT, length INTEGER, created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)",
+    "CREATE TABLE IF NOT EXISTS resume_snapshots ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, "
+    "state TEXT NOT NULL, created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS resume_snapshots_session ON resume_snapshots (session_id, id)",
+)
+
+
+def replay(rows):
+    """Rebuild a conversation history from (op, role, content, length) log rows"""
+    history = []
+    for op, role, content, length in rows:
+        if op == "message":
+            history.append({"role": role, "content": content})
+        elif op == "truncate":
+            del history[length:]
+        elif op == "reset":
+            history = []
+    return history
+
+
+class SessionPersistence:
+    """SQLite message log and resume-state snapshots for chat sessions.
+
+    Sessions append to the log through a background writer that commits
+    queued writes in batches; the database runs in WAL mode so loads never
+    wait for a commit. Compaction folds each log down to its live messages,
+    keeps only the latest snapshot and deletes sessions past the retention.
+    """
+
+    def __init__(self, db_path, commit_interval=SESSION_DB_COMMIT_INTERVAL,
+                 batch_size=SESSION_DB_BATCH_SIZE, compact_interval=SESSION_DB_COMPACT_INTERVAL,
+                 retention=SESSION_DB_RETENTION):
+        self.db_path = db_path
+        self.commit_interval = commit_interval
+        self.batch_size = batch_size
+        self.compact_interval = compact_interval
+        self.retention = retention
+        self._queue = queue.Queue()
+        self._pending = {}  # session_id -> queued writes not committed yet
+        self._pending_changed = threading.Condition()
+        self._local = threading.local()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._writer = None
+        self._compactor = None
+        self.committed = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.loads = 0
+        self.compacted = 0
+        self.pruned = 0
+
+        db = self._connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            db.execute(statement)
+
+    # Writes, called with the session lock held. Each returns the timestamp
+    # the session's updated_at is set to when the write is committed.
+
+    def append(self, session_id, role, content):
+        return self._enqueue(session_id, "message", role, content, None)
+
+    def truncate(self, session_id, length):
+        return self._enqueue(session_id, "truncate", None, None, length)
+
+    def reset(self, session_id):
+        return self._enqueue(session_id, "reset", None, None, None)
+
+    def snapshot(self, session_id, state):
+        # Serialized now; the caller keeps mutating its dicts
+        return self._enqueue(session_id, "snapshot", None, json.dumps(state, ensure_ascii=False), None)
+
+    def _enqueue(self, session_id, op, role, content, length):
+        self._start()
+        now = time.time()
+        with self._pending_changed:
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put((session_id, op, role, content, length, now))
+        return now
+
+    # Reads
+
+    def load(self, session_id):
+        """Return (history, state, updated_at) for a stored session, or None.
+
+        Writes for the session still queued in this process are committed
+        first, so a session evicted from memory reloads as it was.
+        """
+        self._wait_for(session_id)
+        try:
+            db = self._connection()
+            db.execute("BEGIN")
+            try:
+                row = db.execute("SELECT updated_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if row is None:
+                    return None
+                rows = db.execute(
+                    "SELECT op, role, content, length FROM messages WHERE session_id = ? ORDER BY id",
+                    (session_id,),
+                ).fetchall()
+                snapshot = db.execute(
+                    "SELECT state FROM resume_snapshots WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                    (session_id,),
+                ).fetchone()
+            finally:
+                db.execute("COMMIT")
+        except sqlite3.Error as e:
+            logging.error(f"Error loading session {session_id}: {str(e)}")
+            return None
+        self.loads += 1
+        return replay(rows), json.loads(snapshot[0]) if snapshot else {}, row[0]
+
+    def updated_at(self, session_id):
+        """Return when a stored session was last written, by any process, or None.
+
+        A cheap primary-key read that does not wait for this process's queued
+        writes, used to tell whether a cached copy of the session is stale.
+        """
+        try:
+            row = self._connection().execute(
+                "SELECT updated_at FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Error reading session {session_id}: {str(e)}")
+            return None
+        return row[0] if row else None
+
+    def flush(self, timeout=None):
+        """Wait until every queued write has been committed; returns False on timeout"""
+        with self._pending_changed:
+            return self._pending_changed.wait_for(lambda: not self._pending, timeout)
+
+    def _wait_for(self, session_id):
+        with self._pending_changed:
+            self._pending_changed.wait_for(lambda: session_id not in self._pending, timeout=5)
+
+    def stats(self):
+        """Return a snapshot of persistence counters"""
+        with self._pending_changed:
+            queued = sum(self._pending.values())
+        return {
+            "queued": queued,
+            "committed": self.committed,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "loads": self.loads,
+            "compacted": self.compacted,
+            "pruned": self.pruned,
+        }
+
+    # Background threads
+
+    def _start(self):
+        # Threads start on the first write rather than at import, so forked
+        # worker processes each get their own
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+            self._writer.start()
+            if self.compact_interval > 0:
+                self._compactor = threading.Thread(target=self._compact_loop, name="session-compactor", daemon=True)
+                self._compactor.start()
+            atexit.register(self.close)
+            self._started = True
+
+    def close(self, timeout=5):
+        """Commit queued writes and stop the background threads"""
+        if not self._started or self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.commit_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        messages = [row[:6] for row in batch if row[1] != "snapshot"]
+        snapshots = [(row[0], row[3], row[5]) for row in batch if row[1] == "snapshot"]
+        touched = {}
+        for row in batch:
+            touched[row[0]] = row[5]
+        try:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(
+                    "INSERT INTO messages (session_id, op, role, content, length, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", messages)
+                db.executemany(
+                    "INSERT INTO resume_snapshots (session_id, state, created_at) VALUES (?, ?, ?)",
+                    snapshots)
+                db.executemany(
+                    "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    touched.items())
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            self.committed += len(batch)
+            self.batches += 1
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            logging.error(f"Error writing {len(batch)} session updates: {str(e)}")
+        finally:
+            with self._pending_changed:
+                for row in batch:
+                    remaining = self._pending.get(row[0], 0) - 1
+                    if remaining > 0:
+                        self._pending[row[0]] = remaining
+                    else:
+                        self._pending.pop(row[0], None)
+                self._pending_changed.notify_all()
+
+    def _compact_loop(self):
+        while not self._stopping.wait(self.compact_interval):
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                logging.error(f"Error compacting session store: {str(e)}")
+
+    def compact(self, limit=100):
+        """Delete expired sessions and fold up to limit session logs; returns (pruned, compacted)"""
+        db = self._connection()
+        cutoff = time.time() - self.retention
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            expired = [row[0] for row in db.execute(
+                "SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,))]
+            for table in ("messages", "resume_snapshots", "sessions"):
+                db.executemany(f"DELETE FROM {table} WHERE session_id = ?", [(s,) for s in expired])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        candidates = [row[0] for row in db.execute(
+            "SELECT session_id FROM messages WHERE op != 'message' "
+            "UNION SELECT session_id FROM resume_snapshots GROUP BY session_id HAVING COUNT(*) > 1 "
+            "LIMIT ?", (limit,))]
+        for session_id in candidates:
+            self._compact_session(db, session_id)
+
+        self.pruned += len(expired)
+        self.compacted += len(candidates)
+        if expired or candidates:
+            logging.debug(f"Session store compaction pruned {len(expired)} and folded {len(candidates)} sessions")
+        return len(expired), len(candidates)
+
+    def _compact_session(self, db, session_id):
+        # Rewrites the log as plain messages in one write transaction, so
+        # other processes appending to the same session wait rather than
+        # interleave; later appends replay on top of the folded log
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute(
+                "SELECT op, role, content, length, created_at FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+            history = replay(row[:4] for row in rows)
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            created_at = rows[-1][4] if rows else time.time()
+            db.executemany(
+                "INSERT INTO messages (session_id, op, role, content, length, created_at) "
+                "VALUES (?, 'message', ?, ?, NULL, ?)",
+                [(session_id, m["role"], m["content"], created_at) for m in history])
+            db.execute(
+                "DELETE FROM resume_snapshots WHERE session_id = ? AND id < "
+                "(SELECT MAX(id) FROM resume_snapshots WHERE session_id = ?)",
+                (session_id, session_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _connection(self):
+        # One connection per thread; sqlite3 connections are not shareable.
+        # Transactions are explicit, and synchronous=NORMAL is durable across
+        # process crashes in WAL mode
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+
+session_persistence = SessionPersistence(SESSION_DB) if SESSION_DB else None
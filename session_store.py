@@ -0,0 +1,363 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from resume_schema import normalize_resume
+from resume_state import merge_patch, changed_paths
+from session_persistence import session_persistence
+
+# Limits for live chat sessions (overridable from the environment)
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+MAX_SESSION_MEMORY = int(os.getenv("MAX_SESSION_MEMORY", str(64 * 1024 * 1024)))
+
+
+class Session:
+    """Conversation state for a single user"""
+
+    def __init__(self, session_id, journal=None):
+        self.session_id = session_id
+        self.conversation_history = []
+        self.resume_data = {}
+        self.resume_version = 0
+        self.field_versions = {}  # Dotted field path -> resume_version it last changed in
+        self.prompt_variant = None  # "name:version" of the system prompt
+        self.extraction_failed = False  # Last reply had resume JSON that could not be merged
+        # Background extractions scheduled, and the latest one merged or dropped
+        self.extraction_seq = 0
+        self.extraction_applied = 0
+        # A plain Lock so the async path can acquire it from the event loop
+        # thread and release it after awaiting the model
+        self.lock = threading.Lock()
+        # Queues async turns in arrival order; only the first one waits for lock
+        self._async_waiters = asyncio.Lock()
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.size = 0
+        # Turns and extractions using the session; it is not evicted while pinned
+        self.pins = 0
+        # SessionPersistence that durable changes are written to, if any
+        self.journal = journal
+        # Stored updated_at of the latest write this copy made or loaded; a
+        # newer one means another process changed the session since
+        self.persisted_at = 0.0
+
+    async def acquire_async(self):
+        """Acquire the session lock without blocking the event loop"""
+        async with self._async_waiters:
+            if self.lock.acquire(blocking=False):
+                return
+            acquired = asyncio.ensure_future(asyncio.to_thread(self.lock.acquire))
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                # The thread still takes the lock; hand it straight back
+                acquired.add_done_callback(lambda future: self.lock.release())
+                raise
+
+    @property
+    def extraction_pending(self):
+        """Whether a background extraction has not finished yet"""
+        return self.extraction_seq > self.extraction_applied
+
+    def add_message(self, role, content):
+        """Append a message to the history and update the size estimate"""
+        self.conversation_history.append({"role": role, "content": content})
+        self.size += len(content.encode("utf-8")) + len(role)
+        if self.journal is not None:
+            self.persisted_at = self.journal.append(self.session_id, role, content)
+
+    def truncate_history(self, length):
+        """Drop messages after the first length ones"""
+        if length >= len(self.conversation_history):
+            return
+        for message in self.conversation_history[length:]:
+            self.size -= len(message["content"].encode("utf-8")) + len(message["role"])
+        del self.conversation_history[length:]
+        if self.journal is not None:
+            self.persisted_at = self.journal.truncate(self.session_id, length)
+
+    def set_prompt_variant(self, variant):
+        """Pin the system prompt variant used for this session"""
+        if variant == self.prompt_variant:
+            return
+        self.prompt_variant = variant
+        self._save_snapshot()
+
+    def set_resume_data(self, resume_data):
+        """Replace the collected resume data and update the size estimate"""
+        self.size -= self._resume_size()
+        self.resume_data = resume_data
+        self.size += self._resume_size()
+
+    def apply_resume_patch(self, patch):
+        """Merge a JSON merge patch into the resume data and bump field versions.
+
+        The merged resume is validated and normalized; a patch that would
+        make it invalid raises ValidationError and changes nothing.
+        """
+        if not isinstance(patch, dict):
+            raise ValueError("resume patch must be a JSON object")
+        paths = changed_paths(patch)
+        if not paths:
+            return []
+        self.set_resume_data(normalize_resume(merge_patch(self.resume_data, patch)))
+        self.resume_version += 1
+        for path in paths:
+            self.field_versions[path] = self.resume_version
+        self._save_snapshot()
+        return paths
+
+    def reset(self):
+        """Clear the conversation and collected resume data"""
+        self.conversation_history = []
+        self.resume_data = {}
+        self.resume_version = 0
+        self.field_versions = {}
+        self.extraction_failed = False
+        # Results of extractions still in flight are now stale
+        self.extraction_applied = self.extraction_seq
+        self.size = 0
+        if self.journal is not None:
+            self.persisted_at = self.journal.reset(self.session_id)
+            self._save_snapshot()
+
+    def snapshot_state(self):
+        """The resume state that is persisted alongside the message log"""
+        return {
+            "resume_data": self.resume_data,
+            "resume_version": self.resume_version,
+            "field_versions": self.field_versions,
+            "prompt_variant": self.prompt_variant,
+        }
+
+    def restore(self, history, state):
+        """Load persisted history and resume state into a new session"""
+        for message in history:
+            self.conversation_history.append(message)
+            self.size += len(message["content"].encode("utf-8")) + len(message["role"])
+        self.set_resume_data(state.get("resume_data") or {})
+        self.resume_version = state.get("resume_version", 0)
+        self.field_versions = state.get("field_versions") or {}
+        self.prompt_variant = state.get("prompt_variant")
+
+    def _save_snapshot(self):
+        if self.journal is not None:
+            self.persisted_at = self.journal.snapshot(self.session_id, self.snapshot_state())
+
+    def _resume_size(self):
+        if not self.resume_data:
+            return 0
+        try:
+            return len(json.dumps(self.resume_data, ensure_ascii=False).encode("utf-8"))
+        except (TypeError, ValueError):
+            return len(str(self.resume_data))
+
+
+class SessionStore:
+    """Session-keyed conversation store with LRU and idle-TTL eviction.
+
+    Callers that hold on to a session across a turn get it with pin=True
+    and unpin it when done, so it is not evicted and replaced by a second
+    copy while in use. With persistence, eviction only drops the in-memory
+    copy: a session is loaded back from the database the first time it is
+    touched again. A live session is also reloaded when another process has
+    written to it since, so workers that take turns serving one session do
+    not each go on with their own copy.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_ttl=SESSION_IDLE_TTL,
+                 max_memory=MAX_SESSION_MEMORY, persistence=session_persistence):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_memory = max_memory
+        self.persistence = persistence
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # Running total of session sizes, and each session's share of it as
+        # last counted; sizes are recounted whenever a session is touched
+        self._memory = 0
+        self._counted = {}
+        self.evictions = 0
+
+    def get(self, session_id, pin=False):
+        """Return the session for session_id, loading or creating it if needed"""
+        session = self._lookup(session_id, pin)
+        if session is not None:
+            if self._is_stale(session, pin):
+                return self._replace(session, self._load(session_id), pin)
+            return session
+        # Loaded outside the store lock so a slow read only delays this session
+        session = self._load(session_id) or Session(session_id, self.persistence)
+        return self._insert(session, pin)
+
+    async def get_async(self, session_id, pin=False):
+        """Like get, but loads a stored session in a worker thread instead of the event loop"""
+        session = self._lookup(session_id, pin)
+        if session is not None:
+            if self.persistence is not None and await asyncio.to_thread(self._is_stale, session, pin):
+                fresh = await asyncio.to_thread(self._load, session_id)
+                return self._replace(session, fresh, pin)
+            return session
+        if self.persistence is not None:
+            session = await asyncio.to_thread(self._load, session_id)
+        return self._insert(session or Session(session_id, self.persistence), pin)
+
+    def pin(self, session):
+        """Keep a live session from being evicted until unpin"""
+        with self._lock:
+            session.pins += 1
+
+    def unpin(self, session):
+        """Release a pin taken by get(pin=True) or pin()"""
+        with self._lock:
+            session.pins -= 1
+            if self._sessions.get(session.session_id) is session:
+                self._count(session)
+
+    def _lookup(self, session_id, pin=False):
+        # Return the live session and mark it used, or None
+        with self._lock:
+            now = time.time()
+            session = self._sessions.get(session_id)
+            if session is not None and not session.pins and now - session.last_access > self.idle_ttl:
+                logging.debug(f"Session {session_id} expired after idle timeout")
+                self._remove(session_id)
+                self.evictions += 1
+                session = None
+
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_access = now
+                if pin:
+                    session.pins += 1
+                self._count(session)
+                self._evict(now)
+            return session
+
+    def peek(self, session_id):
+        """Return the session for session_id without creating it; stored sessions are loaded"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is not None and self._is_stale(session):
+            return self._replace(session, self._load(session_id))
+        if session is None:
+            session = self._load(session_id)
+            if session is not None:
+                session = self._insert(session)
+        return session
+
+    def discard(self, session_id):
+        """Drop a session from the store"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+
+    def _load(self, session_id):
+        if self.persistence is None:
+            return None
+        record = self.persistence.load(session_id)
+        if record is None:
+            return None
+        history, state, updated_at = record
+        session = Session(session_id)
+        session.restore(history, state)
+        session.journal = self.persistence
+        session.persisted_at = updated_at
+        logging.debug(f"Loaded session {session_id} with {len(session.conversation_history)} messages")
+        return session
+
+    def _is_stale(self, session, pin=False):
+        # Whether another process wrote to the session after this copy last
+        # did. A copy that other requests here are using is left alone.
+        if self.persistence is None or session.pins > (1 if pin else 0):
+            return False
+        updated_at = self.persistence.updated_at(session.session_id)
+        return updated_at is not None and updated_at > session.persisted_at
+
+    def _replace(self, stale, fresh, pin=False):
+        # Swap a reloaded session in for a stale live copy, moving the pin
+        # the caller took with it
+        if fresh is None:
+            return stale
+        with self._lock:
+            if pin:
+                stale.pins -= 1
+            if self._sessions.get(stale.session_id) is stale:
+                self._remove(stale.session_id)
+                self._sessions[stale.session_id] = fresh
+        logging.debug(f"Reloaded session {stale.session_id}, changed by another process")
+        return self._insert(fresh, pin)
+
+    def _insert(self, session, pin=False):
+        with self._lock:
+            now = time.time()
+            # Another request may have loaded or created it meanwhile
+            session = self._sessions.setdefault(session.session_id, session)
+            self._sessions.move_to_end(session.session_id)
+            session.last_access = now
+            if pin:
+                session.pins += 1
+            self._count(session)
+            logging.debug(f"Added session {session.session_id}. Live sessions: {len(self._sessions)}")
+            self._evict(now)
+            return session
+
+    def memory_usage(self):
+        """Approximate bytes held by all live sessions"""
+        with self._lock:
+            return sum(session.size for session in self._sessions.values())
+
+    def stats(self):
+        """Return a snapshot of store counters"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_bytes": sum(session.size for session in self._sessions.values()),
+                "evictions": self.evictions,
+                "max_sessions": self.max_sessions,
+                "max_memory_bytes": self.max_memory,
+                "persistence": self.persistence.stats() if self.persistence is not None else None,
+            }
+
+    def _count(self, session):
+        # Called with the lock held; bring the running total up to date
+        previous = self._counted.get(session.session_id, 0)
+        self._memory += session.size - previous
+        self._counted[session.session_id] = session.size
+
+    def _remove(self, session_id):
+        # Called with the lock held
+        del self._sessions[session_id]
+        self._memory -= self._counted.pop(session_id, 0)
+
+    def _evict(self, now):
+        # Called with the lock held. Walks from the least recently used end
+        # and stops at the first session that is neither idle nor needed to
+        # get back within the session count and memory limits, so a lookup
+        # only touches the sessions it evicts. The most recently used session
+        # and pinned sessions are never evicted.
+        newest = next(reversed(self._sessions), None)
+        count = len(self._sessions)
+        memory = self._memory
+        evicted = []
+        for session_id, session in self._sessions.items():
+            over_limit = count > self.max_sessions or memory > self.max_memory
+            if session_id == newest or not (over_limit or now - session.last_access > self.idle_ttl):
+                break
+            if session.pins:
+                continue
+            evicted.append(session_id)
+            count -= 1
+            memory -= self._counted.get(session_id, 0)
+        for session_id in evicted:
+            logging.debug(f"Evicted session {session_id} ({self._counted.get(session_id, 0)} bytes)")
+            self._remove(session_id)
+            self.evictions += 1
+
+
+session_store = SessionStore()
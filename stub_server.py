@@ -0,0 +1,193 @@
+"""Local OpenAI-compatible chat completion server for load tests and CI.
+
+Run with ``uvicorn stub_server:app --port 8001`` and start the app with
+``LLM_PROVIDER=stub``. Replies are replayed from STUB_SCRIPT (a JSON list)
+or a canned reply, after STUB_LATENCY seconds and at STUB_TOKENS_PER_SECOND.
+
+Script entries are either plain strings, replayed in turn, or objects like
+``{"match": "education", "reply": "..."}`` that answer when the regex
+matches the latest user message.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import time
+import uuid
+
+from json_extractor import extract_json
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.2"))
+# 0 sends the whole reply at once
+STUB_TOKENS_PER_SECOND = float(os.getenv("STUB_TOKENS_PER_SECOND", "200"))
+STUB_SCRIPT = os.getenv("STUB_SCRIPT")
+
+CANNED_REPLY = (
+    "Thanks! Here is what I have so far:\n"
+    "```json\n"
+    '{"name": "Jane Doe", "title": "Software Engineer", "skills": ["Python", "SQL"]}\n'
+    "```\n"
+    "Could you tell me about your work experience next?"
+)
+
+COMPLETION_PATHS = {"/openai/v1/chat/completions", "/v1/chat/completions"}
+
+_TOKEN = re.compile(r"\s*\S+|\s+")
+
+
+def split_tokens(text):
+    """Split text into word-sized pieces that join back to text"""
+    return _TOKEN.findall(text)
+
+
+class Script:
+    """Chooses the reply for a request from the scripted entries"""
+
+    def __init__(self, entries):
+        self.matchers = [(re.compile(entry["match"], re.IGNORECASE), entry["reply"])
+                         for entry in entries if isinstance(entry, dict)]
+        replies = [entry for entry in entries if isinstance(entry, str)]
+        self.replies = itertools.cycle(replies or [CANNED_REPLY])
+
+    @classmethod
+    def load(cls, path):
+        if not path:
+            return cls([])
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def reply(self, messages):
+        user_messages = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+        latest = user_messages[-1] if user_messages else ""
+        for pattern, reply in self.matchers:
+            if pattern.search(latest):
+                return reply
+        return next(self.replies)
+
+
+script = Script.load(STUB_SCRIPT)
+
+
+def json_reply(reply):
+    """The reply as JSON mode would return it: only the JSON object it contains"""
+    return json.dumps(extract_json(reply) or {})
+
+
+def usage(messages, reply):
+    # Same four-characters-per-token estimate the app uses
+    prompt = sum(len(m.get("content") or "") for m in messages) // 4
+    completion = len(split_tokens(reply))
+    return {"prompt_tokens": prompt, "completion_tokens": completion,
+            "total_tokens": prompt + completion}
+
+
+def completion(model, messages, reply):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": reply},
+            "finish_reason": "stop",
+        }],
+        "usage": usage(messages, reply),
+    }
+
+
+def chunk(completion_id, model, delta, finish_reason=None):
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+async def read_json(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return json.loads(body or b"{}")
+
+
+async def send_json(send, data, status=200):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": json.dumps(data).encode("utf-8")})
+
+
+async def stream_reply(send, model, messages, reply):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")],
+    })
+
+    async def event(data):
+        body = f"data: {json.dumps(data)}\n\n".encode("utf-8")
+        await send({"type": "http.response.body", "body": body, "more_body": True})
+
+    await event(chunk(completion_id, model, {"role": "assistant", "content": ""}))
+    tokens = split_tokens(reply) if STUB_TOKENS_PER_SECOND else [reply]
+    for token in tokens:
+        if STUB_TOKENS_PER_SECOND:
+            await asyncio.sleep(1 / STUB_TOKENS_PER_SECOND)
+        await event(chunk(completion_id, model, {"content": token}))
+    final = chunk(completion_id, model, {}, finish_reason="stop")
+    # Groq reports the stream's token usage on the final chunk
+    final["x_groq"] = {"id": completion_id, "usage": usage(messages, reply)}
+    await event(final)
+    await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+
+async def chat_completions(scope, receive, send):
+    try:
+        body = await read_json(receive)
+    except ValueError as e:
+        await send_json(send, {"error": {"message": f"Invalid JSON body: {e}"}}, status=400)
+        return
+
+    messages = body.get("messages", [])
+    model = body.get("model", "stub")
+    reply = script.reply(messages)
+    if (body.get("response_format") or {}).get("type") in ("json_object", "json_schema"):
+        reply = json_reply(reply)
+    if STUB_LATENCY:
+        await asyncio.sleep(STUB_LATENCY)
+
+    if body.get("stream"):
+        await stream_reply(send, model, messages, reply)
+        return
+    if STUB_TOKENS_PER_SECOND:
+        # Non-streamed replies still take as long as generating every token
+        await asyncio.sleep(len(split_tokens(reply)) / STUB_TOKENS_PER_SECOND)
+    await send_json(send, completion(model, messages, reply))
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                logging.info(f"Stub LLM server ready (latency {STUB_LATENCY}s, {STUB_TOKENS_PER_SECOND} tokens/s)")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["method"] == "POST" and scope["path"] in COMPLETION_PATHS:
+        await chat_completions(scope, receive, send)
+        return
+    # Anything else (including the app's HEAD warm-up requests) just succeeds
+    await send_json(send, {"object": "stub"})
@@ -0,0 +1,32 @@
+import json
+
+import bulk_generate
+
+
+def _write_lines(path, records):
+    path.write_text("\n".join(json.dumps(record) for record in records) + "\n", encoding="utf-8")
+
+
+def test_duplicate_ids_are_reported_not_rendered(tmp_path):
+    batch_file = tmp_path / "batch.jsonl"
+    resume = {"personal_info": {"name": "Ada"}}
+    _write_lines(batch_file, [{"id": "a", "resume_data": resume}, {"id": "b", "resume_data": resume},
+                              {"id": "a", "resume_data": resume}])
+    entries = [entry for batch in bulk_generate.read_batches(batch_file, 10, set()) for entry in batch]
+
+    assert [(line_no, key, error is None) for line_no, key, _, error in entries] == [
+        (1, "a", True), (2, "b", True), (3, "a", False)]
+    assert "first used on line 1" in entries[2][3]
+    result = bulk_generate.render_batch([entries[2]], str(tmp_path), "simple")[0]
+    assert result["status"] == "error"
+    assert not (tmp_path / "resume_a.pdf").exists()
+
+
+def test_finished_records_are_skipped(tmp_path):
+    batch_file = tmp_path / "batch.jsonl"
+    _write_lines(batch_file, [{"id": "a", "resume_data": {}}, {"id": "b", "resume_data": {}}])
+    batch_file.write_text(batch_file.read_text(encoding="utf-8") + "not json\n", encoding="utf-8")
+    entries = [entry for batch in bulk_generate.read_batches(batch_file, 10, {"a"}) for entry in batch]
+
+    assert [(line_no, key) for line_no, key, _, _ in entries] == [(2, "b"), (3, "line-3")]
+    assert entries[1][3].startswith("invalid JSON")
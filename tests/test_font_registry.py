@@ -0,0 +1,39 @@
+from fpdf import FPDF
+
+import font_registry
+from font_registry import FontRegistry, RESUME_FONTS
+
+FAMILY = "DejaVu"
+PATH = RESUME_FONTS[FAMILY]
+
+
+def _render(registry):
+    pdf = FPDF()
+    pdf.add_page()
+    registry.add_to(pdf, FAMILY, PATH)
+    pdf.set_font(FAMILY, size=12)
+    pdf.cell(0, 10, "Résumé")
+    return bytes(pdf.output())
+
+
+def test_shared_font_entry():
+    registry = FontRegistry()
+    assert _render(registry).startswith(b"%PDF")
+    assert _render(registry).startswith(b"%PDF")
+    assert registry.stats() == {"fonts": 1, "parsed": 1, "fallbacks": 0}
+
+
+def test_falls_back_to_add_font_without_subset_map(monkeypatch):
+    # As with an fpdf2 release that no longer has fpdf.fpdf.SubsetMap
+    monkeypatch.setattr(font_registry, "SubsetMap", None)
+    registry = FontRegistry()
+    assert _render(registry).startswith(b"%PDF")
+    assert registry.preload() == 0
+    assert registry.stats() == {"fonts": 0, "parsed": 0, "fallbacks": 1}
+
+
+def test_falls_back_to_add_font_for_unknown_font_entry(monkeypatch):
+    registry = FontRegistry()
+    monkeypatch.setattr(registry, "load", lambda family, path, style="": object())
+    assert _render(registry).startswith(b"%PDF")
+    assert registry.fallbacks == 1
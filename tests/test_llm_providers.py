@@ -0,0 +1,24 @@
+import llm_providers
+
+
+def test_fallback_uses_its_own_server_and_key(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "primary-key")
+    monkeypatch.setenv("LLM_BREAKER_ENABLED", "1")
+    monkeypatch.setenv("LLM_FALLBACK_PROVIDER", "groq")
+    monkeypatch.setenv("LLM_FALLBACK_BASE_URL", "http://fallback.invalid")
+    monkeypatch.setenv("LLM_FALLBACK_API_KEY", "fallback-key")
+    provider = llm_providers.create_provider("groq")
+
+    assert provider.primary.api_key == "primary-key"
+    assert provider.fallback.api_key == "fallback-key"
+    assert str(provider.fallback.client.base_url).startswith("http://fallback.invalid")
+    assert str(provider.primary.client.base_url).startswith("https://api.groq.com")
+
+
+def test_breaker_settings_are_read_when_built(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "key")
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "2")
+    monkeypatch.setenv("LLM_BREAKER_ENABLED", "1")
+    assert llm_providers.create_provider("groq").breaker.failure_threshold == 2
+    monkeypatch.setenv("LLM_BREAKER_ENABLED", "0")
+    assert isinstance(llm_providers.create_provider("groq"), llm_providers.GroqProvider)
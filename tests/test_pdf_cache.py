@@ -0,0 +1,43 @@
+import os
+import time
+
+from pdf_cache import PDFCache
+
+KEYS = [f"{n:064x}" for n in range(4)]
+
+
+def _cache(tmp_path, **settings):
+    return PDFCache(str(tmp_path), write_behind=False, sweep_interval=0, **settings)
+
+
+def _store(cache, key, size, age):
+    path = cache.path_for(key)
+    with open(path, "wb") as f:
+        f.write(b"%" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_sweep_deletes_expired_files(tmp_path):
+    cache = _cache(tmp_path, disk_ttl=60, disk_max_bytes=0)
+    old = _store(cache, KEYS[0], 10, age=120)
+    fresh = _store(cache, KEYS[1], 10, age=5)
+    other = tmp_path / "notes.pdf"
+    other.write_bytes(b"not the cache's")
+    os.utime(other, (0, 0))
+
+    assert cache.sweep() == 1
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh) and other.exists()
+    assert cache.stats()["disk_evicted"] == 1
+
+
+def test_sweep_deletes_least_recently_used_over_size_limit(tmp_path):
+    cache = _cache(tmp_path, disk_ttl=0, disk_max_bytes=25)
+    paths = [_store(cache, key, 10, age=40 - 10 * n) for n, key in enumerate(KEYS)]
+    # A disk hit makes the oldest file the most recently used
+    assert cache.get_path(KEYS[0], render=lambda: None) == paths[0]
+
+    assert cache.sweep() == 2
+    assert [os.path.exists(path) for path in paths] == [True, False, False, True]
@@ -0,0 +1,35 @@
+from render_jobs import RenderJobs, DONE, FAILED
+from render_pool import RenderQueueFull
+
+
+def _wait_finished(jobs, job):
+    version = 0
+    while not job.finished:
+        version = jobs.wait(job, version, timeout=5)
+    return job
+
+
+def test_job_fails_when_render_queue_stays_full():
+    jobs = RenderJobs(concurrency=1, sweep_interval=0, queue_timeout=0.2)
+
+    def render_to_path(started):
+        raise RenderQueueFull(0.05)
+
+    job = _wait_finished(jobs, jobs.submit("busy", render_to_path))
+    assert job.state == FAILED
+    assert job.to_dict()["error"] == "render queue busy"
+
+
+def test_job_waits_for_a_place_in_the_render_queue():
+    jobs = RenderJobs(concurrency=1, sweep_interval=0, queue_timeout=5)
+    attempts = []
+
+    def render_to_path(started):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RenderQueueFull(0.01)
+        started()
+        return "/tmp/resume_test.pdf"
+
+    job = _wait_finished(jobs, jobs.submit("eventually", render_to_path))
+    assert job.state == DONE and len(attempts) == 3
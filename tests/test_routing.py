@@ -0,0 +1,14 @@
+import chatbot_logic
+from session_store import Session
+
+
+def test_plain_first_turn_uses_chat_route():
+    session = Session("routing-test")
+    for message in ("Hi, help me build my resume", "Can you generate some ideas for my summary?"):
+        assert chatbot_logic.choose_route(session, message) is chatbot_logic.CHAT_ROUTE
+
+
+def test_export_request_uses_extract_route():
+    session = Session("routing-test")
+    for message in ("Please export it as a PDF", "Give me the final JSON", "I'm ready to finalize"):
+        assert chatbot_logic.choose_route(session, message) is chatbot_logic.EXTRACT_ROUTE
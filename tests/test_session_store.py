@@ -0,0 +1,43 @@
+from session_persistence import SessionPersistence
+from session_store import SessionStore
+
+
+def _worker(db_path):
+    # Each worker process has its own persistence writer and session cache
+    return SessionStore(persistence=SessionPersistence(str(db_path), compact_interval=0))
+
+
+def test_cached_session_reloads_after_another_worker_writes(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    first, second = _worker(db_path), _worker(db_path)
+
+    first.get("s1").add_message("user", "hello")
+    first.persistence.flush()
+    second.get("s1").add_message("assistant", "hi")
+    second.persistence.flush()
+
+    session = first.get("s1")
+    assert [m["content"] for m in session.conversation_history] == ["hello", "hi"]
+    assert first.get("s1") is session  # Up to date now, so kept
+
+
+def test_own_writes_do_not_reload(tmp_path):
+    store = _worker(tmp_path / "sessions.db")
+    session = store.get("s1")
+    session.add_message("user", "hello")
+    store.persistence.flush()
+    assert store.get("s1") is session
+    assert store.peek("s1") is session
+
+
+def test_pinned_session_is_not_replaced(tmp_path):
+    db_path = tmp_path / "sessions.db"
+    first, second = _worker(db_path), _worker(db_path)
+    session = first.get("s1", pin=True)
+    session.add_message("user", "hello")
+    first.persistence.flush()
+    second.get("s1").add_message("assistant", "hi")
+    second.persistence.flush()
+
+    assert first.get("s1", pin=True) is session
+    assert session.pins == 2